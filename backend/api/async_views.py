@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+from .replicas import check_connections
+from .timing import (install_query_wrappers, measure_render,
+                     request_query_wrappers)
+
+# Сколько частей потокового ответа читается за один переход в поток.
+STREAM_BATCH = 500
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков для чтения; у каждого потока свое соединение с БД."""
+    return ThreadPoolExecutor(max_workers=settings.ASYNC_THREADS,
+                              thread_name_prefix='async-read')
+
+
+def request_action(view, method):
+    method = method.lower()
+    return (getattr(view, 'actions', None) or {}).get(method, method)
+
+
+def run_in_pool(view, request, *args, **kwargs):
+    """Выполняет view и рендеринг ответа в потоке пула.
+
+    Сигналы request_started/request_finished ASGI-обработчик отправляет
+    в другом потоке, поэтому соединения потока пула закрываются здесь.
+    По той же причине к ним заново подключаются обертки SQL-запросов
+    Server-Timing и метрик.
+    """
+    close_old_connections()
+    check_connections()
+    try:
+        with install_query_wrappers(request_query_wrappers()):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                with measure_render():
+                    response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обертка view с действиями из async_actions класса.
+
+    Эти действия выполняются в общем пуле потоков и не занимают
+    цикл событий на время запросов к БД. Остальные действия идут в
+    синхронный поток, как обычные синхронные view под ASGI.
+    """
+    actions = getattr(view.cls, 'async_actions', ())
+    sync_view = sync_to_async(view)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request_action(view, request.method) not in actions:
+            return await sync_view(request, *args, **kwargs)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(), functools.partial(
+                context.run, run_in_pool, view, request, *args, **kwargs))
+
+    return wrapper
+
+
+def async_patterns(patterns):
+    """Заменяет view с async_actions на асинхронные обертки."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            async_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            view_class = getattr(pattern.callback, 'cls', None)
+            if getattr(view_class, 'async_actions', ()):
+                pattern.callback = async_view(pattern.callback)
+    return patterns
+
+
+def take_parts(parts):
+    return list(islice(parts, STREAM_BATCH))
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI-обработчик, читающий потоковые ответы вне цикла событий.
+
+    Django 3.2 перебирает StreamingHttpResponse прямо в цикле событий,
+    и запросы к БД из генератора ответа (курсор списка покупок) падают
+    с SynchronousOnlyOperation после уже отправленного статуса 200.
+    Здесь части ответа читаются пачками через sync_to_async в том же
+    потоке, что и синхронные view, поэтому курсор остается в одном
+    соединении.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append((
+                b'Set-Cookie',
+                cookie.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+        parts = iter(response)
+        read = sync_to_async(take_parts, thread_sensitive=True)
+        while True:
+            batch = await read(parts)
+            if not batch:
+                break
+            await send({'type': 'http.response.body',
+                        'body': b''.join(batch), 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import CustomUser
+
+# Кеши, которые не видны другим процессам.
+PROCESS_CACHES = (DummyCache, LocMemCache)
+RECORD_FIELDS = frozenset(('id', 'email', 'username', 'first_name',
+                           'last_name', 'is_active', 'is_staff',
+                           'is_superuser'))
+# Model.from_db ожидает значения в порядке полей модели.
+USER_FIELDS = tuple(field.attname for field in CustomUser._meta.concrete_fields
+                    if field.attname in RECORD_FIELDS)
+
+
+def token_cache_key(key):
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+class LocalTokenCache:
+    """Ограниченный LRU-кеш процесса с временем жизни записей."""
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, record = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return record
+
+    def set(self, key, record):
+        with self._lock:
+            self._items[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_LOCAL_TIMEOUT, record)
+            self._items.move_to_end(key)
+            while len(self._items) > settings.TOKEN_CACHE_SIZE:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class TokenCache:
+    """Ключ токена -> значения USER_FIELDS активного пользователя.
+
+    Сначала проверяется кеш процесса, затем общий кеш
+    TOKEN_CACHE_ALIAS, если он общий для процессов (не LocMemCache).
+    Сброс записи удаляет ее из общего кеша и из кеша текущего процесса;
+    остальные процессы перестают ее использовать через
+    TOKEN_CACHE_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self.local = LocalTokenCache()
+
+    @property
+    def shared(self):
+        alias = settings.TOKEN_CACHE_ALIAS
+        if not alias or isinstance(caches[alias], PROCESS_CACHES):
+            return None
+        return caches[alias]
+
+    def get(self, key):
+        record = self.local.get(key)
+        if record is None and self.shared is not None:
+            record = self.shared.get(token_cache_key(key))
+            if record is not None:
+                self.local.set(key, record)
+        return record
+
+    def set(self, key, record):
+        self.local.set(key, record)
+        if self.shared is not None:
+            self.shared.set(token_cache_key(key), record,
+                            timeout=settings.TOKEN_CACHE_TIMEOUT)
+
+    def delete(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self.local.delete(key)
+        if self.shared is not None and keys:
+            self.shared.delete_many([token_cache_key(key) for key in keys])
+
+    def invalidate(self, keys):
+        """Сбрасывает записи сразу и еще раз после фиксации транзакции."""
+        keys = tuple(keys)
+        self.delete(keys)
+        transaction.on_commit(lambda: self.delete(keys))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД при попадании в кеш.
+
+    Пользователь собирается из сохраненных полей, остальные поля
+    загружаются из БД при первом обращении.
+    """
+
+    def authenticate_credentials(self, key):
+        record = token_cache.get(key)
+        if record is None:
+            record = self.load_record(key)
+            token_cache.set(key, record)
+        user = CustomUser.from_db('default', USER_FIELDS, record)
+        return user, Token(key=key, user=user)
+
+    def load_record(self, key):
+        record = Token.objects.filter(key=key).values_list(
+            *(f'user__{name}' for name in USER_FIELDS)).first()
+        if record is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not record[USER_FIELDS.index('is_active')]:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return record
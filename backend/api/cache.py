@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .authentication import PROCESS_CACHES
+from .metrics import record_cache
+from .replicas import using_primary
+
+GLOBAL = 'global'
+LISTS = 'lists'
+LIST_PARAMS = ('author', 'cursor', 'limit', 'ordering', 'page', 'search',
+               'tags')
+
+
+def author_generation(author_id):
+    return f'author:{author_id}'
+
+
+def tag_generation(slug):
+    return f'tag:{slug}'
+
+
+def recipe_generation(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+class RecipeCache:
+    """Кеш ответов для анонимных запросов к рецептам.
+
+    Ключ записи включает счетчики поколений, от которых зависит ответ:
+    глобальный, по автору, по тегу или по рецепту. Увеличение счетчика
+    делает все зависящие от него записи недоступными.
+
+    Ответы кешируются, только если кеш общий для процессов: счетчики в
+    LocMemCache увеличиваются лишь в процессе, где была запись, и
+    остальные процессы отдавали бы устаревшие ответы.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_CACHE_ALIAS]
+
+    @property
+    def shared(self):
+        return not isinstance(self.cache, PROCESS_CACHES)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def _count(self, hit):
+        record_cache(hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _generation_key(self, name):
+        return f'recipes:gen:{name}'
+
+    def get_generations(self, names):
+        keys = [self._generation_key(name) for name in names]
+        values = self.cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in values}
+        if missing:
+            for key, value in missing.items():
+                if not self.cache.add(key, value, timeout=None):
+                    missing[key] = self.cache.get(key, value)
+            values.update(missing)
+        return [values[key] for key in keys]
+
+    def bump(self, names):
+        for name in set(names):
+            key = self._generation_key(name)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, time.time_ns(), timeout=None)
+
+    def invalidate(self, *names):
+        """Увеличивает счетчики после фиксации текущей транзакции."""
+        names = tuple(names)
+        transaction.on_commit(lambda: self.bump(names))
+
+    def make_key(self, request, kind, params, generations):
+        raw = '|'.join((request.scheme, request.get_host(), kind,
+                        repr(params), repr(generations)))
+        return f'recipes:{kind}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+    def list_key(self, request):
+        query = request.query_params
+        params = tuple((name, tuple(sorted(query.getlist(name))))
+                       for name in LIST_PARAMS if name in query)
+        names = [GLOBAL]
+        authors = query.getlist('author')
+        tags = query.getlist('tags')
+        names += [author_generation(author) for author in authors]
+        names += [tag_generation(slug) for slug in tags]
+        if not authors and not tags:
+            names.append(LISTS)
+        return self.make_key(request, 'list', params,
+                             self.get_generations(names))
+
+    def detail_key(self, request, pk):
+        generations = self.get_generations((GLOBAL, recipe_generation(pk)))
+        return self.make_key(request, 'detail', pk, generations)
+
+    def get_response(self, key, view_method, request, *args, **kwargs):
+        data = self.cache.get(key)
+        if data is not None:
+            self._count(hit=True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        self._count(hit=False)
+        # Запись живет до смены поколения, поэтому не читается с реплики.
+        with using_primary():
+            response = view_method(request, *args, **kwargs)
+        if response.status_code == 200:
+            self.cache.set(key, response.data,
+                           timeout=settings.RECIPE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+recipe_cache = RecipeCache()
+
+
+class RecipeCacheMixin:
+    """Отдает анонимным пользователям список и рецепт из кеша."""
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated or not recipe_cache.shared:
+            return super().list(request, *args, **kwargs)
+        return recipe_cache.get_response(
+            recipe_cache.list_key(request),
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated or not recipe_cache.shared:
+            return super().retrieve(request, *args, **kwargs)
+        return recipe_cache.get_response(
+            recipe_cache.detail_key(request, kwargs[self.lookup_field]),
+            super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,73 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """Поддержка условных GET-запросов (ETag / Last-Modified).
+
+    Валидатор вычисляется дешевым запросом до сериализации, и при
+    совпадении клиенту отдается 304 без обращения к сериализатору.
+    """
+    conditional_actions = ('list', 'retrieve')
+
+    def get_list_validator(self, request):
+        model = self.get_queryset().model
+        state = model.objects.aggregate(
+            last_modified=Max('modified'), total=Count('id'))
+        return ((state['total'], state['last_modified'],
+                 request.query_params.urlencode()),
+                state['last_modified'])
+
+    def get_detail_validator(self, request, pk):
+        last_modified = self.get_queryset().model.objects.filter(
+            pk=pk).values_list('modified', flat=True).first()
+        if last_modified is None:
+            return None
+        return (pk, last_modified), last_modified
+
+    def get_validator(self, request, **kwargs):
+        """Возвращает пару (части ETag, дата изменения) или None."""
+        if self.action == 'list':
+            return self.get_list_validator(request)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(
+                kwargs[self.lookup_field])
+        except ValidationError:
+            # Обработчик ответит 404, как и без условного запроса.
+            return None
+        return self.get_detail_validator(request, pk)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validator = self.get_validator(request, **kwargs)
+        if validator is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = validator
+        etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+        timestamp = (int(last_modified.timestamp())
+                     if last_modified is not None else None)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,285 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import timedelta
+from heapq import nlargest
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from recipes.models import IngredientAmount, Recipe
+
+from .cache import recipe_cache
+from .readers import RECIPE_FIELDS, RecipeListReader
+from .replicas import using_primary
+
+COOKING = 'cooking'
+# Рецепты, измененные незадолго до прошлой синхронизации, читаются
+# повторно: их транзакция могла зафиксироваться позже.
+SYNC_MARGIN = timedelta(seconds=60)
+# При большем числе измененных рецептов индекс строится заново.
+MAX_SYNC_RECIPES = 1000
+# Id рецептов сверяются с базой по диапазонам такого размера; при
+# большем числе расходящихся диапазонов индекс строится заново.
+ID_BUCKET = 1024
+MAX_SYNC_BUCKETS = 32
+ABSENT = -1
+
+
+class CookingIndex:
+    """Обратный индекс: ингредиент -> отсортированный массив id рецептов.
+
+    Для каждого рецепта хранится число его ингредиентов (ABSENT для
+    несуществующих id), чтобы считать долю рецепта, которая есть у
+    пользователя, а для диапазонов id - число и сумма id рецептов для
+    сверки с базой.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.synced = timezone.now()
+        self.postings = defaultdict(lambda: array('q'))
+        self.sizes = array('h')
+        self.count = 0
+        self.buckets = {}
+        self.checked = time.monotonic()
+        # Массивы, общие с индексом, из которого сделана копия.
+        self.shared = set()
+
+    def clone(self):
+        """Копия для синхронизации, пока запросы читают этот индекс.
+
+        Массивы ингредиентов копируются при первом изменении.
+        """
+        index = CookingIndex(self.version)
+        index.synced = self.synced
+        index.postings.update(self.postings)
+        index.sizes = array('h', self.sizes)
+        index.count = self.count
+        index.buckets = dict(self.buckets)
+        index.shared = set(self.postings)
+        return index
+
+    def posting(self, ingredient_id):
+        """Массив рецептов ингредиента, который можно изменять."""
+        posting = self.postings[ingredient_id]
+        if ingredient_id in self.shared:
+            posting = self.postings[ingredient_id] = array('q', posting)
+            self.shared.discard(ingredient_id)
+        return posting
+
+    def count_id(self, recipe_id, delta):
+        bucket = recipe_id // ID_BUCKET
+        count, total = self.buckets.get(bucket, (0, 0))
+        if count + delta:
+            self.buckets[bucket] = (count + delta, total + delta * recipe_id)
+        else:
+            del self.buckets[bucket]
+
+    def add_recipe(self, recipe_id):
+        if recipe_id >= len(self.sizes):
+            self.sizes.extend(
+                [ABSENT] * (recipe_id + 1 - len(self.sizes)))
+        if self.sizes[recipe_id] == ABSENT:
+            self.count += 1
+            self.count_id(recipe_id, 1)
+        self.sizes[recipe_id] = 0
+
+    def remove_recipe(self, recipe_id):
+        if recipe_id >= len(self.sizes) or self.sizes[recipe_id] == ABSENT:
+            return
+        if self.sizes[recipe_id]:
+            for ingredient_id, posting in list(self.postings.items()):
+                position = bisect_left(posting, recipe_id)
+                if (position < len(posting)
+                        and posting[position] == recipe_id):
+                    del self.posting(ingredient_id)[position]
+        self.sizes[recipe_id] = ABSENT
+        self.count -= 1
+        self.count_id(recipe_id, -1)
+
+    def build(self):
+        for recipe_id in Recipe.objects.values_list(
+                'id', flat=True).iterator():
+            self.add_recipe(recipe_id)
+        rows = IngredientAmount.objects.order_by(
+            'ingredient_id', 'recipe_id').values_list(
+                'ingredient_id', 'recipe_id').iterator()
+        for ingredient_id, recipe_id in rows:
+            self.postings[ingredient_id].append(recipe_id)
+            self.sizes[recipe_id] += 1
+
+    def diff_ids(self):
+        """Id рецептов, удаленных из базы, и id, которых нет в индексе.
+
+        Число и сумма id по диапазонам сравниваются одним запросом, сами
+        id читаются только для разошедшихся диапазонов. Возвращает None,
+        если таких диапазонов больше MAX_SYNC_BUCKETS.
+        """
+        stored = {
+            row['bucket']: (row['count'], row['total'])
+            for row in Recipe.objects.order_by().annotate(
+                bucket=F('id') / ID_BUCKET
+            ).values('bucket').annotate(count=Count('id'), total=Sum('id'))}
+        buckets = [bucket for bucket in stored.keys() | self.buckets.keys()
+                   if stored.get(bucket) != self.buckets.get(bucket)]
+        if len(buckets) > MAX_SYNC_BUCKETS:
+            return None
+        deleted, missing = set(), set()
+        for bucket in buckets:
+            start = bucket * ID_BUCKET
+            existing = set(Recipe.objects.filter(
+                id__gte=start, id__lt=start + ID_BUCKET
+            ).values_list('id', flat=True))
+            indexed = {
+                recipe_id for recipe_id in range(
+                    start, min(start + ID_BUCKET, len(self.sizes)))
+                if self.sizes[recipe_id] != ABSENT}
+            deleted |= indexed - existing
+            missing |= existing - indexed
+        return deleted, missing
+
+    def sync(self, version):
+        """Переносит в индекс рецепты, измененные и удаленные с прошлой
+        синхронизации. Возвращает False, если изменений слишком много."""
+        synced = timezone.now()
+        changed = set(Recipe.objects.filter(
+            modified__gte=self.synced - SYNC_MARGIN
+        ).values_list('id', flat=True)[:MAX_SYNC_RECIPES + 1])
+        diff = self.diff_ids()
+        if diff is None:
+            return False
+        deleted, missing = diff
+        # Рецепт мог попасть в базу с датой изменения раньше окна.
+        changed |= missing
+        if len(changed) > MAX_SYNC_RECIPES:
+            return False
+        for recipe_id in deleted:
+            self.remove_recipe(recipe_id)
+        for recipe_id in changed:
+            self.remove_recipe(recipe_id)
+            self.add_recipe(recipe_id)
+        rows = IngredientAmount.objects.filter(
+            recipe_id__in=changed).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows:
+            posting = self.posting(ingredient_id)
+            posting.insert(bisect_left(posting, recipe_id), recipe_id)
+            self.sizes[recipe_id] += 1
+        self.version = version
+        self.synced = synced
+        return True
+
+    def match(self, ingredient_ids, limit):
+        """Рецепты с наибольшей долей ингредиентов из ingredient_ids.
+
+        Возвращает тройки (id рецепта, доля, число недостающих); оба
+        числа считаются по индексу, а не по прочитанным строкам рецептов.
+        """
+        overlap = Counter()
+        for ingredient_id in set(ingredient_ids):
+            posting = self.postings.get(ingredient_id)
+            if posting:
+                overlap.update(posting)
+        sizes = self.sizes
+        best = nlargest(limit, (
+            (matched / sizes[recipe_id], matched, recipe_id)
+            for recipe_id, matched in overlap.items()))
+        return [(recipe_id, coverage, sizes[recipe_id] - matched)
+                for coverage, matched, recipe_id in best]
+
+
+class CookingIndexLoader:
+    """Хранит индекс и догоняет изменения рецептов по версии COOKING.
+
+    Первое обращение строит индекс целиком, дальше читаются только
+    рецепты с новой датой изменения: после смены версии или, если ее
+    изменили в другом процессе с LocMemCache, раз в
+    COOKING_INDEX_RECHECK секунд. Обновляется копия индекса, а запросы
+    до ее подмены отвечают по прежнему индексу.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def fresh(self, index, version):
+        return (index is not None and index.version == version
+                and time.monotonic() - index.checked
+                < settings.COOKING_INDEX_RECHECK)
+
+    def refresh(self):
+        version, = recipe_cache.get_generations((COOKING,))
+        index = self._index
+        if self.fresh(index, version):
+            return index
+        if not self._lock.acquire(blocking=index is None):
+            return index
+        try:
+            index = self._index
+            if self.fresh(index, version):
+                return index
+            with using_primary():
+                if index is not None:
+                    index = index.clone()
+                if index is None or not index.sync(version):
+                    index = CookingIndex(version)
+                    index.build()
+            self._index = index
+            return index
+        finally:
+            self._lock.release()
+
+    def match(self, ingredient_ids, limit):
+        return self.refresh().match(ingredient_ids, limit)
+
+
+cooking_index = CookingIndexLoader()
+
+
+def parse_positive(values, field):
+    try:
+        numbers = [int(value) for value in values]
+    except ValueError:
+        numbers = [0]
+    if any(number <= 0 for number in numbers):
+        raise ValidationError({field: 'Ожидаются положительные целые числа.'})
+    return numbers
+
+
+class WhatCanICookMixin:
+    """GET recipes/what_can_i_cook/?ingredients=1&ingredients=2.
+
+    Рецепты упорядочены по доле ингредиентов, которые есть у пользователя;
+    к каждому добавляются coverage и missing (сколько ингредиентов
+    не хватает). Размер ответа задает ?limit=, не больше COOKING_LIMIT.
+    """
+
+    @action(detail=False, url_path='what_can_i_cook')
+    def what_can_i_cook(self, request):
+        ingredient_ids = parse_positive(
+            request.query_params.getlist('ingredients'), 'ingredients')
+        if not ingredient_ids:
+            raise ValidationError({'ingredients': 'Укажите ингредиенты.'})
+        limit, = parse_positive(
+            request.query_params.getlist('limit')[:1]
+            or [api_settings.PAGE_SIZE], 'limit')
+        matches = cooking_index.match(
+            ingredient_ids, min(limit, settings.COOKING_LIMIT))
+        rows = {row['id']: row for row in self.annotate_flags(
+            Recipe.objects.filter(id__in=[match[0] for match in matches])
+        ).values(*RECIPE_FIELDS)}
+        # Индекс может опережать реплику или отставать от удаления.
+        matches = [match for match in matches if match[0] in rows]
+        data = RecipeListReader(request).serialize(
+            rows[recipe_id] for recipe_id, _, _ in matches)
+        for item, (_, coverage, missing) in zip(data, matches):
+            item['coverage'] = round(coverage, 3)
+            item['missing'] = missing
+        return Response(data)
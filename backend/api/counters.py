@@ -0,0 +1,33 @@
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Recipe
+from users.models import CustomUser
+
+from .signals import invalidate_recipe_by_id
+
+
+def change_favorites(recipe_id, delta):
+    Recipe.objects.filter(id=recipe_id).update(
+        favorites_count=F('favorites_count') + delta)
+    invalidate_recipe_by_id(recipe_id)
+
+
+def change_recipes(author_id, delta):
+    CustomUser.objects.filter(id=author_id).update(
+        recipes_count=F('recipes_count') + delta)
+
+
+def change_followers(author_id, delta):
+    CustomUser.objects.filter(id=author_id).update(
+        followers_count=F('followers_count') + delta)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def release_user(sender, instance, **kwargs):
+    """Уменьшает счетчики, которые удаление пользователя снимет каскадом."""
+    Recipe.objects.filter(favorites__user=instance).update(
+        favorites_count=F('favorites_count') - 1)
+    CustomUser.objects.filter(following__follower=instance).update(
+        followers_count=F('followers_count') - 1)
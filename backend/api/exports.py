@@ -0,0 +1,73 @@
+import csv
+import json
+from functools import lru_cache
+from itertools import chain
+
+from django.conf import settings
+
+from recipes.models import ShoppingListItem
+
+from .pdf import StreamingPDF, TrueTypeFont
+
+TITLE = 'Список покупок:'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def shopping_list_rows(user):
+    """Итератор по списку покупок через курсор на сервере."""
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def render_txt(rows):
+    yield TITLE
+    for name, unit, amount in rows:
+        yield f'\n{name} - {amount}, {unit}'
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for name, unit, amount in rows:
+        yield writer.writerow((name, amount, unit))
+
+
+def render_json(rows):
+    separator = ''
+    yield '['
+    for name, unit, amount in rows:
+        yield separator + json.dumps(
+            {'name': name, 'amount': amount, 'measurement_unit': unit},
+            ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    return TrueTypeFont(settings.SHOPPING_LIST_PDF_FONT)
+
+
+def render_pdf(rows):
+    lines = chain((TITLE, ''), (f'{name} - {amount}, {unit}'
+                                for name, unit, amount in rows))
+    return StreamingPDF(get_pdf_font()).render(lines)
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+    'pdf': ('application/pdf', render_pdf),
+}
@@ -0,0 +1,115 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F
+from rest_framework.decorators import action
+from rest_framework.fields import DateTimeField
+from rest_framework.permissions import IsAuthenticated
+
+from recipes.models import FeedEntry, Recipe, Subscribe
+from users.models import CustomUser
+
+from .pagination import MergedKeysetPaginator
+from .readers import RECIPE_FIELDS, RecipeListReader
+
+FEED_ORDERING = ('-published', '-id')
+
+
+def insert_entries(entries):
+    """Записывает строки ленты пачками по FEED_BATCH_SIZE."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def publish(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора.
+
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раскладываются (fanned_out остается False) и читаются из ленты
+    напрямую. Строка автора блокируется так же, как при подписке, чтобы
+    новый подписчик не пропустил рецепт.
+    """
+    followers_count = CustomUser.objects.select_for_update().filter(
+        id=recipe.author_id).values_list('followers_count', flat=True).get()
+    if followers_count > settings.FEED_FANOUT_LIMIT:
+        return
+    follower_ids = Subscribe.objects.filter(
+        following_id=recipe.author_id).values_list(
+            'follower_id', flat=True).iterator()
+    insert_entries(
+        FeedEntry(follower_id=follower_id, recipe_id=recipe.id,
+                  author_id=recipe.author_id, created=recipe.created)
+        for follower_id in follower_ids)
+    Recipe.objects.filter(id=recipe.id).update(fanned_out=True)
+    recipe.fanned_out = True
+
+
+def publish_pending(recipes):
+    """Раскладывает по лентам рецепты, созданные в обход publish.
+
+    Вызывается командами загрузки после создания подписок; как и в
+    publish, рецепты авторов с подписчиками больше FEED_FANOUT_LIMIT
+    остаются неразосланными.
+    """
+    recipes = recipes.filter(
+        fanned_out=False,
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT)
+    rows = recipes.filter(author__following__isnull=False).values_list(
+        'id', 'author_id', 'created',
+        'author__following__follower_id').iterator()
+    insert_entries(
+        FeedEntry(follower_id=follower_id, recipe_id=recipe_id,
+                  author_id=author_id, created=created)
+        for recipe_id, author_id, created, follower_id in rows)
+    recipes.update(fanned_out=True)
+
+
+def follow(follower_id, author_id):
+    """Добавляет в ленту нового подписчика разосланные рецепты автора."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id, fanned_out=True).values_list(
+            'id', 'created').iterator()
+    insert_entries(
+        FeedEntry(follower_id=follower_id, recipe_id=recipe_id,
+                  author_id=author_id, created=created)
+        for recipe_id, created in recipes)
+
+
+def unfollow(follower_id, author_id):
+    FeedEntry.objects.filter(
+        follower_id=follower_id, author_id=author_id).delete()
+
+
+class FeedMixin:
+    """GET recipes/feed/: новые рецепты авторов из подписок.
+
+    Лента собирается из записей FeedEntry пользователя и неразосланных
+    рецептов авторов, на которых он подписан; страницы листаются
+    курсором (?cursor=) по дате создания и id рецепта.
+    """
+
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            pagination_class=MergedKeysetPaginator)
+    def feed(self, request):
+        user = request.user
+        timeline = Recipe.objects.filter(
+            feed_entries__follower=user).annotate(
+                published=F('feed_entries__created'))
+        direct = Recipe.objects.filter(
+            fanned_out=False, author__in=Subscribe.objects.filter(
+                follower=user).values('following'))
+        direct = direct.annotate(published=F('created'))
+        querysets = [
+            self.annotate_flags(queryset).order_by(*FEED_ORDERING).values(
+                *RECIPE_FIELDS, 'published')
+            for queryset in (timeline, direct)]
+        rows = self.paginate_queryset(querysets)
+        data = RecipeListReader(request).serialize(rows)
+        created = DateTimeField()
+        for item, row in zip(data, rows):
+            item['created'] = created.to_representation(row['published'])
+        return self.get_paginated_response(data)
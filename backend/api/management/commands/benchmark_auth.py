@@ -0,0 +1,84 @@
+from time import perf_counter
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.authentication import CachedTokenAuthentication, token_cache
+from users.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает TokenAuthentication и CachedTokenAuthentication: '
+            'вызовы authenticate() и запросы GET /api/users/me/ в секунду. '
+            'Все изменения откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=500)
+
+    def prepare(self):
+        user = CustomUser.objects.create(
+            email='benchmark@example.com', username='benchmark',
+            first_name='benchmark', last_name='benchmark')
+        return Token.objects.create(user=user)
+
+    def measure(self, func, count):
+        token_cache.local.clear()
+        func()
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            for _ in range(count):
+                func()
+            elapsed = perf_counter() - started
+        return count / elapsed, len(queries) / count
+
+    def authenticate(self, token, calls):
+        request = APIRequestFactory().get(
+            '/api/users/me/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        for name, auth in (('TokenAuthentication', TokenAuthentication()),
+                           ('CachedTokenAuthentication',
+                            CachedTokenAuthentication())):
+            yield name, self.measure(lambda: auth.authenticate(request),
+                                     calls)
+
+    def requests(self, token, count):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        def get():
+            assert client.get('/api/users/me/').status_code == 200
+
+        with mock.patch.object(
+                CachedTokenAuthentication, 'authenticate_credentials',
+                TokenAuthentication.authenticate_credentials):
+            yield 'без кеша', self.measure(get, count)
+        yield 'с кешем', self.measure(get, count)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                token = self.prepare()
+                results = [
+                    ('authenticate()', 'вызовов',
+                     list(self.authenticate(token, options['calls']))),
+                    ('GET /api/users/me/', 'запросов',
+                     list(self.requests(token, options['requests']))),
+                ]
+                raise Rollback
+        except Rollback:
+            pass
+        token_cache.local.clear()
+        for title, unit, rows in results:
+            self.stdout.write(title)
+            for name, (rate, queries) in rows:
+                self.stdout.write(f'  {name:<26} {rate:>9.0f} {unit}/с, '
+                                  f'{queries:.1f} SQL-запросов на вызов')
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+SERVERS = {
+    'sync': ('foodgram.wsgi',),
+    'async': ('foodgram.asgi', '-k', 'uvicorn.workers.UvicornWorker'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Client:
+    """HTTP/1.1 GET с повторным использованием соединения, если сервер
+    его не закрывает (синхронные воркеры gunicorn закрывают)."""
+
+    def __init__(self, port, headers):
+        self.port = port
+        self.headers = ''.join(f'{name}: {value}\r\n'
+                               for name, value in headers.items())
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                '127.0.0.1', self.port)
+        self.writer.write((f'GET {path} HTTP/1.1\r\n'
+                           f'Host: localhost\r\n{self.headers}\r\n').encode())
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = dict(line.split(': ', 1) for line in lines[1:] if line)
+        headers = {name.lower(): value for name, value in headers.items()}
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+            await self.close()
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+
+async def load(port, paths, headers, concurrency, duration):
+    """Каждый клиент по кругу запрашивает paths до истечения duration."""
+    latencies = []
+    errors = 0
+    deadline = perf_counter() + duration
+
+    async def worker(offset):
+        nonlocal errors
+        client = Client(port, headers)
+        index = offset
+        while perf_counter() < deadline:
+            started = perf_counter()
+            try:
+                status = await client.get(paths[index % len(paths)])
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status = None
+                await client.close()
+            if status == 200:
+                latencies.append(perf_counter() - started)
+            else:
+                errors += 1
+            index += 1
+        await client.close()
+
+    started = perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return latencies, errors, perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность синхронных воркеров '
+            'gunicorn и воркеров uvicorn с асинхронными view на '
+            'читающих эндпоинтах при заданном числе одновременных '
+            'клиентов. Используются данные текущей базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', default=list(SERVERS),
+                            choices=list(SERVERS))
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[50, 500])
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--anonymous', action='store_true',
+                            help='без токена; рецепты отдаются из кеша')
+
+    def paths(self):
+        recipe = Recipe.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or tag is None or ingredient is None:
+            raise CommandError('Нет данных: выполните generate_data.')
+        paths = [
+            '/api/recipes/?limit=6',
+            f'/api/recipes/{recipe.id}/',
+            '/api/tags/',
+            f'/api/ingredients/?name={ingredient.name[:2]}',
+        ]
+        if not self.anonymous:
+            paths.append('/api/users/subscriptions/')
+        return paths
+
+    def headers(self):
+        if self.anonymous:
+            return {}
+        user = CustomUser.objects.order_by('id').first()
+        token, _ = Token.objects.get_or_create(user=user)
+        return {'Authorization': f'Token {token.key}'}
+
+    def start(self, mode, port, workers):
+        env = {**os.environ, 'ASYNC_VIEWS': str(mode == 'async')}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *SERVERS[mode],
+             '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+             '--backlog', '2048', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {mode} не запустился.')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.kill()
+        raise CommandError(f'Сервер {mode} не ответил за 30 секунд.')
+
+    def stop(self, server):
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    def handle(self, *args, **options):
+        self.anonymous = options['anonymous']
+        paths, headers = self.paths(), self.headers()
+        for mode in options['modes']:
+            port = free_port()
+            server = self.start(mode, port, options['workers'])
+            try:
+                asyncio.run(load(port, paths, headers, 1, 1))
+                for concurrency in options['concurrency']:
+                    latencies, errors, elapsed = asyncio.run(load(
+                        port, paths, headers, concurrency,
+                        options['duration']))
+                    self.report(mode, concurrency, latencies, errors,
+                                elapsed)
+            finally:
+                self.stop(server)
+
+    def report(self, mode, concurrency, latencies, errors, elapsed):
+        if latencies:
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        else:
+            p50 = p99 = 0
+        self.stdout.write(
+            f'{mode:<6} {concurrency:>4} клиентов: '
+            f'{len(latencies) / elapsed:>7.1f} запросов/с, '
+            f'p50 {p50:.0f} мс, p99 {p99:.0f} мс, ошибок {errors}')
@@ -0,0 +1,100 @@
+import random
+import statistics
+from datetime import timedelta
+from io import StringIO
+from time import perf_counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.cache import recipe_cache
+from api.cooking import COOKING
+from recipes.models import Ingredient, Recipe
+
+PATH = '/api/recipes/what_can_i_cook/'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Измеряет GET /api/recipes/what_can_i_cook/ на синтетических '
+            'данных generate_data: построение индекса, догрузку изменений '
+            'и p50/p95 времени ответа для случайных наборов ингредиентов. '
+            'Завершается ошибкой, если p95 больше --target-ms. Все '
+            'изменения откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--fridge', type=int, nargs=2, default=(3, 10),
+                            metavar=('MIN', 'MAX'))
+        parser.add_argument('--popular', type=int, default=300,
+                            help='наборы выбираются из N самых частых '
+                                 'ингредиентов')
+        parser.add_argument('--target-ms', type=float, default=100)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def timed(self, client, params):
+        started = perf_counter()
+        response = client.get(PATH, params)
+        elapsed = (perf_counter() - started) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{PATH}: ответ {response.status_code}')
+        return elapsed
+
+    def fridges(self, count, low, high, popular):
+        ingredient_ids = list(Ingredient.objects.annotate(
+            uses=Count('ingredient_amount')).order_by('-uses').values_list(
+                'id', flat=True)[:popular])
+        sizes = (min(self.rng.randint(low, high), len(ingredient_ids))
+                 for _ in range(count))
+        return [{'ingredients': self.rng.sample(ingredient_ids, size)}
+                for size in sizes]
+
+    def run(self, options):
+        call_command('generate_data', users=options['users'],
+                     recipes=options['recipes'], prefix='cooking',
+                     seed=options['seed'], stdout=StringIO())
+        # Иначе все рецепты попадают в окно SYNC_MARGIN и догрузка
+        # превращается в полное построение.
+        Recipe.objects.update(modified=F('modified') - timedelta(hours=1))
+        client = APIClient()
+        fridges = self.fridges(options['requests'], *options['fridge'],
+                               options['popular'])
+        build = self.timed(client, fridges[0])
+        self.stdout.write(f'Построение индекса и первый ответ: {build:.1f} мс')
+
+        recipe = Recipe.objects.order_by('?').first()
+        Recipe.objects.filter(id=recipe.id).update(modified=timezone.now())
+        recipe_cache.bump((COOKING,))
+        sync = self.timed(client, fridges[0])
+        self.stdout.write(f'Догрузка изменений и ответ: {sync:.1f} мс')
+
+        timings = [self.timed(client, fridge) for fridge in fridges]
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(
+            f'{len(timings)} запросов: p50 {p50:.1f} мс, p95 {p95:.1f} мс, '
+            f'максимум {max(timings):.1f} мс')
+        return p95
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                p95 = self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        if p95 > options['target_ms']:
+            raise CommandError(
+                f'p95 {p95:.1f} мс больше цели {options["target_ms"]} мс.')
+        self.stdout.write(self.style.SUCCESS(
+            f'p95 {p95:.1f} мс в пределах {options["target_ms"]} мс.'))
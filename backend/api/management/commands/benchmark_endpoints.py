@@ -0,0 +1,362 @@
+import json
+import os
+import statistics
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from io import StringIO
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver, resolve
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+DATASETS = {
+    'small': {'users': 30, 'recipes': 100, 'tags': 5},
+    'large': {'users': 300, 'recipes': 3000, 'tags': 20},
+}
+PAGE_SIZES = (6, 50)
+PASSWORD = 'benchmark-password'
+PIXEL = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1P'
+         'eAAAADElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC')
+# Число запросов зависит от СУБД, поэтому базовая линия своя для каждой.
+BASELINE = 'benchmark_baseline_{vendor}.json'
+
+# Действия djoser по управлению учетной записью (активация, сброс и смена
+# почты и пароля, изменение и удаление профиля) фронтендом не
+# используются и не измеряются.
+SKIPPED = {
+    ('api/users/activation/', 'POST'),
+    ('api/users/resend_activation/', 'POST'),
+    ('api/users/reset_password/', 'POST'),
+    ('api/users/reset_password_confirm/', 'POST'),
+    ('api/users/reset_email/', 'POST'),
+    ('api/users/reset_email_confirm/', 'POST'),
+    ('api/users/set_email/', 'POST'),
+    ('api/users/me/', 'PUT'),
+    ('api/users/me/', 'PATCH'),
+    ('api/users/me/', 'DELETE'),
+    ('api/users/<id>/', 'PUT'),
+    ('api/users/<id>/', 'PATCH'),
+    ('api/users/<id>/', 'DELETE'),
+}
+
+
+@dataclass
+class Case:
+    name: str
+    method: str
+    path: str
+    data: dict = None
+    paged: bool = False
+
+
+def recipe_data(ctx):
+    return {
+        'name': 'benchmark', 'text': 'benchmark', 'cooking_time': 10,
+        'image': PIXEL, 'tags': [ctx['tag_id']],
+        'ingredients': [{'id': ingredient_id, 'amount': 10}
+                        for ingredient_id in ctx['ingredient_ids']],
+    }
+
+
+CASES = (
+    Case('root', 'GET', '/api/'),
+    Case('ingredients', 'GET', '/api/ingredients/'),
+    Case('ingredients_search', 'GET', '/api/ingredients/?name={search}'),
+    Case('ingredient', 'GET', '/api/ingredients/{ingredient_id}/'),
+    Case('tags', 'GET', '/api/tags/'),
+    Case('tag', 'GET', '/api/tags/{tag_id}/'),
+    Case('recipes', 'GET', '/api/recipes/?limit={limit}', paged=True),
+    Case('recipes_by_tag', 'GET',
+         '/api/recipes/?limit={limit}&tags={tag_slug}', paged=True),
+    Case('recipes_favorited', 'GET',
+         '/api/recipes/?limit={limit}&is_favorited=1', paged=True),
+    Case('recipes_cursor', 'GET', '/api/recipes/?limit={limit}&cursor=',
+         paged=True),
+    Case('recipe', 'GET', '/api/recipes/{recipe_id}/'),
+    Case('feed', 'GET', '/api/recipes/feed/?limit={limit}', paged=True),
+    Case('what_can_i_cook', 'GET', '/api/recipes/what_can_i_cook/?{fridge}'),
+    Case('recipe_create', 'POST', '/api/recipes/', recipe_data),
+    Case('recipe_update', 'PATCH', '/api/recipes/{own_recipe_id}/',
+         recipe_data),
+    Case('recipe_replace', 'PUT', '/api/recipes/{own_recipe_id}/',
+         recipe_data),
+    Case('recipe_delete', 'DELETE', '/api/recipes/{own_recipe_id}/'),
+    Case('favorite_add', 'POST', '/api/recipes/{recipe_id}/favorite/'),
+    Case('favorite_remove', 'DELETE',
+         '/api/recipes/{favorite_id}/favorite/'),
+    Case('cart_add', 'POST', '/api/recipes/{recipe_id}/shopping_cart/'),
+    Case('cart_remove', 'DELETE', '/api/recipes/{cart_id}/shopping_cart/'),
+    Case('cart_download', 'GET', '/api/recipes/download_shopping_cart/'),
+    Case('users', 'GET', '/api/users/?limit={limit}', paged=True),
+    Case('user', 'GET', '/api/users/{author_id}/'),
+    Case('user_me', 'GET', '/api/users/me/'),
+    Case('user_create', 'POST', '/api/users/', lambda ctx: {
+        'email': 'new.user@example.com', 'username': 'new_user',
+        'first_name': 'Новый', 'last_name': 'Пользователь',
+        'password': 'Sd83-kq1Z-plm0'}),
+    Case('set_password', 'POST', '/api/users/set_password/', lambda ctx: {
+        'current_password': PASSWORD, 'new_password': f'{PASSWORD}-new'}),
+    Case('subscriptions', 'GET',
+         '/api/users/subscriptions/?limit={limit}&recipes_limit=3',
+         paged=True),
+    Case('subscribe', 'POST', '/api/users/{author_id}/subscribe/'),
+    Case('unsubscribe', 'DELETE', '/api/users/{followed_id}/subscribe/'),
+    Case('token_login', 'POST', '/api/auth/token/login/', lambda ctx: {
+        'email': ctx['email'], 'password': PASSWORD}),
+    Case('token_logout', 'POST', '/api/auth/token/logout/'),
+)
+
+
+def api_routes():
+    """Пары (маршрут, метод) приложения без вариантов с ?format."""
+    def walk(patterns, prefix=''):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, route)
+            elif route.startswith('api/') and 'format' not in route:
+                yield normalize(route), pattern.callback
+
+    routes = set()
+    for route, callback in walk(get_resolver().url_patterns):
+        actions = getattr(callback, 'actions', None)
+        view_class = getattr(callback, 'view_class', None)
+        if actions:
+            # DRF добавляет head в actions при первом GET-запросе.
+            methods = [method for method in actions if method != 'head']
+        else:
+            methods = [method for method in view_class.http_method_names
+                       if method not in ('options', 'head', 'trace')
+                       and hasattr(view_class, method)]
+        routes.update((route, method.upper()) for method in methods)
+    return routes
+
+
+def normalize(route):
+    for old, new in (('(?P<pk>[^/.]+)', '<id>'), ('(?P<id>[^/.]+)', '<id>'),
+                     ('<int:id>', '<id>'), ('^', ''), ('$', ''),
+                     ('/?', '/')):
+        route = route.replace(old, new)
+    return route
+
+
+class Command(BaseCommand):
+    help = ('Измеряет число запросов к БД, время и пиковую память для '
+            'всех маршрутов API анонимно и с токеном на сгенерированных '
+            'наборах данных. Все изменения откатываются. Завершается с '
+            'ошибкой, если число запросов растет с размером страницы или '
+            'превышает базовую линию для используемой СУБД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', nargs='+', default=list(DATASETS),
+                            choices=[*DATASETS, 'current'],
+                            help='current - данные текущей базы')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark_report.json')
+        parser.add_argument('--baseline',
+                            help='по умолчанию benchmark_baseline_<СУБД>.json '
+                                 'в каталоге backend')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='записать число запросов в базовую линию')
+
+    def check_coverage(self):
+        covered = {(normalize(resolve(case.path.split('?')[0].format(
+            **self.placeholder_ctx)).route), case.method) for case in CASES}
+        return sorted(api_routes() - covered - SKIPPED)
+
+    @property
+    def placeholder_ctx(self):
+        return {key: 1 for key in (
+            'ingredient_id', 'tag_id', 'recipe_id', 'own_recipe_id',
+            'favorite_id', 'cart_id', 'author_id', 'followed_id')}
+
+    def prepare(self, dataset):
+        """Генерирует данные и готовит пользователя с токеном."""
+        if dataset != 'current':
+            call_command('generate_data', prefix=f'benchmark-{dataset}',
+                         seed=self.seed, stdout=StringIO(),
+                         **DATASETS[dataset])
+        user = CustomUser.objects.annotate(
+            recipes_total=Count('resipe', distinct=True),
+        ).filter(recipes_total__gt=0).order_by('-recipes_total').first()
+        if user is None:
+            raise CommandError('В базе нет рецептов для измерений.')
+        user.set_password(PASSWORD)
+        user.save(update_fields=['password'])
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        others = Recipe.objects.exclude(author=user).exclude(
+            favorites__user=user).exclude(shoppingсarts__user=user)
+        authors = CustomUser.objects.exclude(id=user.id).exclude(
+            following__follower=user).filter(recipes_count__gt=0)
+        recipe_ids = list(others.order_by('-favorites_count').values_list(
+            'id', flat=True)[:3])
+        author_ids = list(authors.values_list('id', flat=True)[:2])
+        if len(recipe_ids) < 3 or len(author_ids) < 2:
+            raise CommandError('Слишком мало данных для измерений.')
+        client.post(f'/api/recipes/{recipe_ids[1]}/favorite/')
+        client.post(f'/api/recipes/{recipe_ids[2]}/shopping_cart/')
+        client.post(f'/api/users/{author_ids[1]}/subscribe/')
+        ingredient = Ingredient.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        ctx = {
+            'email': user.email,
+            'search': ingredient.name[:2],
+            'ingredient_id': ingredient.id,
+            'ingredient_ids': list(Ingredient.objects.order_by(
+                'id').values_list('id', flat=True)[:5]),
+            'fridge': '&'.join(
+                f'ingredients={ingredient_id}' for ingredient_id in
+                Ingredient.objects.order_by('id').values_list(
+                    'id', flat=True)[:5]),
+            'tag_id': tag.id,
+            'tag_slug': tag.slug,
+            'recipe_id': recipe_ids[0],
+            'favorite_id': recipe_ids[1],
+            'cart_id': recipe_ids[2],
+            'own_recipe_id': user.resipe.order_by('id').first().id,
+            'author_id': author_ids[0],
+            'followed_id': author_ids[1],
+        }
+        return client, ctx
+
+    def request(self, client, case, ctx, limit):
+        path = case.path.format(limit=limit, **ctx)
+        data = case.data(ctx) if case.data else None
+        with transaction.atomic():
+            response = getattr(client, case.method.lower())(
+                path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, client, case, ctx, limit):
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(client, case, ctx, limit)
+        query_count = len(queries)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings = []
+        for _ in range(self.repeat):
+            started = perf_counter()
+            self.request(client, case, ctx, limit)
+            timings.append((perf_counter() - started) * 1000)
+        return {
+            'status': response.status_code,
+            'queries': query_count,
+            'time_ms': round(statistics.median(timings), 2),
+            'peak_kb': round(peak / 1024, 1),
+            'cache': response.get('X-Cache'),
+        }
+
+    def run_dataset(self, dataset):
+        client, ctx = self.prepare(dataset)
+        clients = {'anon': APIClient(), 'auth': client}
+        results = {}
+        for case in CASES:
+            for role, role_client in clients.items():
+                for limit in (PAGE_SIZES if case.paged else (None,)):
+                    key = f'{dataset}:{role}:{case.name}'
+                    if limit is not None:
+                        key += f':{limit}'
+                    results[key] = {
+                        'method': case.method,
+                        'path': case.path.format(limit=limit, **ctx),
+                        **self.measure(role_client, case, ctx, limit),
+                    }
+                    self.stdout.write(
+                        f'{key:<45} {results[key]["status"]} '
+                        f'{results[key]["queries"]:>3} запросов '
+                        f'{results[key]["time_ms"]:>8.1f} мс '
+                        f'{results[key]["peak_kb"]:>8.1f} КБ')
+        return results
+
+    def growth_failures(self, results):
+        failures = []
+        small, large = PAGE_SIZES
+        for key, result in results.items():
+            if key.endswith(f':{small}'):
+                bigger = results[f'{key[:-len(str(small))]}{large}']
+                if bigger['queries'] > result['queries']:
+                    failures.append(
+                        f'{key[:-len(str(small)) - 1]}: запросов '
+                        f'{result["queries"]} при limit={small} и '
+                        f'{bigger["queries"]} при limit={large}')
+        return failures
+
+    def baseline_failures(self, results, baseline):
+        return [
+            f'{key}: {result["queries"]} запросов, в базовой линии '
+            f'{baseline[key]}'
+            for key, result in results.items()
+            if key in baseline and result['queries'] > baseline[key]]
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.seed = options['seed']
+        failures = [f'маршрут не измеряется: {method} {route}'
+                    for route, method in self.check_coverage()]
+        results = {}
+        # Кеш ответов включается только с общим для процессов кешем.
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            RECIPE_CACHE_ALIAS='benchmark',
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }, 'benchmark': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(media_root, 'cache'),
+            }},
+        ):
+            for dataset in options['datasets']:
+                with transaction.atomic():
+                    results.update(self.run_dataset(dataset))
+                    transaction.set_rollback(True)
+        failures += self.growth_failures(results)
+        baseline_path = options['baseline'] or os.path.join(
+            settings.BASE_DIR, BASELINE.format(vendor=connection.vendor))
+        baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        elif not options['update_baseline']:
+            self.stdout.write(
+                f'Нет базовой линии {baseline_path}, проверяется только '
+                f'рост числа запросов с размером страницы.')
+        if options['update_baseline']:
+            baseline.update({key: result['queries']
+                             for key, result in results.items()})
+            with open(baseline_path, 'w', encoding='utf-8') as file:
+                json.dump(baseline, file, indent=2, sort_keys=True)
+                file.write('\n')
+        else:
+            failures += self.baseline_failures(results, baseline)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'repeat': self.repeat,
+                'results': results,
+                'failures': failures,
+            }, file, ensure_ascii=False, indent=2)
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f'Измерено {len(results)} запросов, отчет: {options["output"]}'))
@@ -0,0 +1,128 @@
+import random
+import statistics
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.filters import RecipeFilter
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from users.models import CustomUser
+
+DISHES = ('суп', 'салат', 'пирог', 'рагу', 'омлет', 'каша', 'запеканка',
+          'котлеты', 'плов', 'борщ', 'паста', 'блины', 'соус', 'жаркое')
+ADJECTIVES = ('томатный', 'грибной', 'куриный', 'сырный', 'овощной',
+              'рыбный', 'домашний', 'острый', 'сладкий', 'летний',
+              'пряный', 'картофельный', 'гороховый', 'творожный')
+WORDS = ('нарезать', 'обжарить', 'варить', 'запекать', 'посолить',
+         'перемешать', 'добавить', 'подавать', 'остудить', 'взбить',
+         'духовке', 'сковороде', 'кастрюле', 'минут', 'огне', 'масле')
+INGREDIENTS = ('курица', 'говядина', 'картофель', 'морковь', 'лук',
+               'чеснок', 'томаты', 'сыр', 'грибы', 'рис', 'мука', 'яйца',
+               'молоко', 'сметана', 'творог', 'лосось', 'горох', 'перец',
+               'капуста', 'свекла', 'укроп', 'петрушка', 'масло', 'сахар')
+PAGE_SIZE = 6
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Измеряет ?search= списка рецептов на --recipes синтетических '
+            'рецептах: первая страница и число найденных, отдельно и '
+            'вместе с фильтром по тегу. На PostgreSQL показывает, '
+            'использует ли план GIN-индекс. Все изменения откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--terms', nargs='+', default=[
+            'томатный суп', 'лосось', 'грибы -сыр', 'запечь в духовке',
+            'несуществующее'])
+
+    def prepare(self):
+        author = CustomUser.objects.create(
+            username='search-author', email='search-author@example.com',
+            first_name='search-author', last_name='search-author')
+        self.tag = Tag.objects.create(name='search', color='#000001',
+                                      slug='search-benchmark')
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit='г')
+             for name in INGREDIENTS], ignore_conflicts=True)
+        ingredient_ids = list(Ingredient.objects.filter(
+            name__in=INGREDIENTS).values_list('id', flat=True))
+        return author, ingredient_ids
+
+    def recipe(self, author, index):
+        return Recipe(
+            author=author, image='recipes/images/generated.png',
+            name=f'{self.rng.choice(ADJECTIVES).capitalize()} '
+                 f'{self.rng.choice(DISHES)} {index}',
+            text=' '.join(self.rng.choice(WORDS) for _ in range(12)),
+            cooking_time=self.rng.randint(5, 180))
+
+    def populate(self, count, batch_size):
+        started = perf_counter()
+        author, ingredient_ids = self.prepare()
+        for start in range(0, count, batch_size):
+            recipes = Recipe.objects.bulk_create(
+                self.recipe(author, index)
+                for index in range(start, min(start + batch_size, count)))
+            if recipes[0].pk is None:
+                recipes = list(Recipe.objects.filter(
+                    author=author).order_by('-id')[:len(recipes)])
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=self.rng.randint(1, 500))
+                for recipe in recipes
+                for ingredient_id in self.rng.sample(
+                    ingredient_ids, self.rng.randint(2, 6)))
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=self.tag.id)
+                for recipe in recipes if self.rng.random() < 0.1)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE recipes_recipe')
+        self.stdout.write(f'Создано {count} рецептов за '
+                          f'{perf_counter() - started:.1f} с.')
+
+    def filtered(self, params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        return RecipeFilter(request.query_params, Recipe.objects.all(),
+                            request=request).qs
+
+    def measure(self, params):
+        timings = []
+        for _ in range(self.repeat):
+            started = perf_counter()
+            queryset = self.filtered(params)
+            total = queryset.count()
+            list(queryset.values('id', 'name')[:PAGE_SIZE])
+            timings.append((perf_counter() - started) * 1000)
+        plan = ''
+        if connection.vendor == 'postgresql':
+            explained = self.filtered(params)[:PAGE_SIZE].explain()
+            plan = (', индекс' if 'recipes_recipe_search_vector' in explained
+                    else ', без индекса')
+        return f'{statistics.median(timings):>8.1f} мс ({total} найдено{plan})'
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.repeat = options['repeat']
+        try:
+            with transaction.atomic():
+                self.populate(options['recipes'], options['batch_size'])
+                for term in options['terms']:
+                    alone = self.measure({'search': term})
+                    tagged = self.measure(
+                        {'search': term, 'tags': self.tag.slug})
+                    self.stdout.write(
+                        f'{term!r:<20} {alone}, с тегом {tagged}')
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,120 @@
+import base64
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Tag
+from users.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Измеряет запись рецептов с разным числом ингредиентов: '
+            'создание, сохранение без изменений состава и частичное '
+            'изменение. Запись идет как во вьюсете: проверка, сохранение '
+            'и ответ. Все изменения откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[5, 50, 200])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def prepare(self, size):
+        author = CustomUser.objects.create(
+            email='benchmark@example.com', username='benchmark',
+            first_name='benchmark', last_name='benchmark')
+        tags = [Tag.objects.create(name=f'benchmark {index}',
+                                   color=f'#00000{index}',
+                                   slug=f'benchmark-{index}')
+                for index in range(2)]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark {index}', measurement_unit='г')
+            for index in range(size * 2))
+        if not ingredients[0].pk:
+            ingredients = list(Ingredient.objects.filter(
+                name__startswith='benchmark ').order_by('id'))
+        request = Request(APIRequestFactory().post('/api/recipes/'))
+        request.user = author
+        view = RecipeViewSet(request=request, format_kwarg=None)
+        return {'request': request, 'view': view}, tags, ingredients
+
+    def data(self, name, tags, ingredients, amount=1):
+        return {
+            'name': name, 'text': name, 'cooking_time': 1,
+            'image': self.image, 'tags': [tag.id for tag in tags],
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient in ingredients],
+        }
+
+    def save(self, context, data, instance=None):
+        serializer = RecipeSerializer(instance, data=data, context=context)
+        serializer.is_valid(raise_exception=True)
+        recipe = serializer.save()
+        serializer.data
+        return recipe
+
+    def measure(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            result = func()
+            elapsed = perf_counter() - started
+        return result, elapsed, len(queries)
+
+    def run_size(self, size, repeat):
+        context, tags, ingredients = self.prepare(size)
+        queryset = context['view'].get_queryset()
+        first, rest = ingredients[:size], ingredients[size:]
+        changed = first[:size // 2] + rest[:size - size // 2]
+        results = {'create': [0, 0], 'same': [0, 0], 'change': [0, 0]}
+
+        def record(name, elapsed, queries):
+            results[name][0] += elapsed
+            results[name][1] += queries
+
+        for index in range(repeat):
+            recipe, *stats = self.measure(lambda: self.save(
+                context, self.data(f'benchmark {index}', tags, first)))
+            record('create', *stats)
+            recipe = queryset.get(id=recipe.id)
+            _, *stats = self.measure(lambda: self.save(
+                context, self.data('renamed', tags, first), recipe))
+            record('same', *stats)
+            recipe = queryset.get(id=recipe.id)
+            _, *stats = self.measure(lambda: self.save(
+                context, self.data('changed', tags[:1], changed, 2), recipe))
+            record('change', *stats)
+        return {name: (elapsed * 1000 / repeat, queries / repeat)
+                for name, (elapsed, queries) in results.items()}
+
+    def handle(self, *args, **options):
+        image = BytesIO()
+        Image.new('RGB', (1, 1)).save(image, 'PNG')
+        self.image = 'data:image/png;base64,' + base64.b64encode(
+            image.getvalue()).decode()
+        with TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                for size in options['sizes']:
+                    self.run(size, options['repeat'])
+
+    def run(self, size, repeat):
+        try:
+            with transaction.atomic():
+                results = self.run_size(size, repeat)
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(f'{size:>4} ингредиентов: ' + ', '.join(
+            f'{name} {elapsed:.1f} мс / {queries:.0f} запросов'
+            for name, (elapsed, queries) in results.items()))
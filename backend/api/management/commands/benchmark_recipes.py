@@ -0,0 +1,72 @@
+import json
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.readers import RECIPE_FIELDS, RecipeListReader
+from api.serializers import RecipeListSerializer
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает RecipeListSerializer и RecipeListReader: '
+            'проверяет совпадение ответа и измеряет пропускную способность.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[6, 50, 500])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--user', help='email пользователя для запросов')
+
+    def make_view(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        return RecipeViewSet(request=request, action='list',
+                             format_kwarg=None)
+
+    def serializer_data(self, user, size):
+        view = self.make_view(user)
+        return RecipeListSerializer(
+            view.get_queryset().order_by('name', 'id')[:size], many=True,
+            context={'request': view.request}).data
+
+    def reader_data(self, user, size):
+        view = self.make_view(user)
+        rows = view.annotate_flags(Recipe.objects.all()).order_by(
+            'name', 'id').values(*RECIPE_FIELDS)[:size]
+        return RecipeListReader(view.request).serialize(rows)
+
+    def measure(self, func, user, size, repeat):
+        started = perf_counter()
+        for _ in range(repeat):
+            data = func(user, size)
+        return len(data) * repeat / (perf_counter() - started), data
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['user']:
+            user = CustomUser.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError('Пользователь не найден.')
+        total = Recipe.objects.count()
+        for size in options['sizes']:
+            if size > total:
+                self.stdout.write(self.style.WARNING(
+                    f'В базе {total} рецептов, страница {size} неполная.'))
+            serializer_rate, expected = self.measure(
+                self.serializer_data, user, size, options['repeat'])
+            reader_rate, actual = self.measure(
+                self.reader_data, user, size, options['repeat'])
+            if json.dumps(expected) != json.dumps(actual):
+                raise CommandError(
+                    f'Ответ RecipeListReader для {size} рецептов '
+                    f'не совпадает с RecipeListSerializer.')
+            self.stdout.write(
+                f'{size:>5} рецептов: сериализатор {serializer_rate:.0f}/с, '
+                f'reader {reader_rate:.0f}/с '
+                f'(x{reader_rate / serializer_rate:.1f})')
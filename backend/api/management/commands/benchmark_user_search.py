@@ -0,0 +1,136 @@
+import random
+import statistics
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.search import UserSearchFilter
+from users.models import CustomUser
+
+SYLLABLES = ('ан', 'ва', 'ге', 'до', 'ка', 'ли', 'ма', 'не', 'ол', 'ра',
+             'са', 'ти', 'фе', 'ша', 'ел', 'ин', 'ов', 'ко', 'ря', 'зу')
+LATIN = ('an', 'va', 'ge', 'do', 'ka', 'li', 'ma', 'ne', 'ol', 'ra',
+         'sa', 'ti', 'fe', 'sha', 'el', 'in', 'ov', 'ko', 'rya', 'zu')
+PAGE_SIZE = 6
+
+
+class Rollback(Exception):
+    pass
+
+
+class LegacySearchView:
+    search_fields = ('username',)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск пользователей через SearchFilter по username '
+            'и UserSearchFilter на --users синтетических пользователях: '
+            'первая страница и число найденных. Все изменения '
+            'откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--terms', nargs='+',
+                            help='по умолчанию выбираются из созданных имен')
+
+    def word(self, alphabet):
+        return ''.join(self.rng.choice(alphabet)
+                       for _ in range(self.rng.randint(2, 4)))
+
+    def users(self, count):
+        for index in range(count):
+            yield CustomUser(
+                username=f'{self.word(LATIN)}{index}',
+                email=f'search{index}@example.com',
+                first_name=f'{self.word(SYLLABLES).capitalize()} {index}',
+                last_name=f'{self.word(SYLLABLES).capitalize()}ов {index}',
+                password='!')
+
+    def populate(self, count, batch_size):
+        started = perf_counter()
+        batch = []
+        for user in self.users(count):
+            batch.append(user)
+            if len(batch) == batch_size:
+                CustomUser.objects.bulk_create(batch)
+                batch = []
+        CustomUser.objects.bulk_create(batch)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE users_customuser')
+        self.stdout.write(f'Создано {count} пользователей за '
+                          f'{perf_counter() - started:.1f} с.')
+
+    def default_terms(self):
+        sample = CustomUser.objects.filter(
+            email__startswith='search').order_by('?').values_list(
+                'username', 'first_name', 'last_name')[:2]
+        (username, first_name, _), (_, _, last_name) = sample
+        surname = last_name.split()[0]
+        typo = surname[:2] + surname[3:]
+        return [username[:3], first_name.split()[0].lower(),
+                surname[1:5], typo, 'несуществующий']
+
+    def measure(self, backend, view, term):
+        request = Request(APIRequestFactory().get(
+            '/api/users/', {'search': term}))
+        timings = []
+        for _ in range(self.repeat):
+            started = perf_counter()
+            queryset = backend.filter_queryset(
+                request, CustomUser.objects.all(), view)
+            total = queryset.count()
+            list(queryset[:PAGE_SIZE])
+            timings.append((perf_counter() - started) * 1000)
+        return statistics.median(timings), total
+
+    def uses_index(self, term):
+        if connection.vendor != 'postgresql':
+            return ''
+        request = Request(APIRequestFactory().get(
+            '/api/users/', {'search': term}))
+        plan = UserSearchFilter().filter_queryset(
+            request, CustomUser.objects.all(), None)[:PAGE_SIZE].explain()
+        return (', индекс' if 'users_customuser_search_trgm' in plan
+                else ', без индекса')
+
+    def endpoint_queries(self, term):
+        staff = CustomUser.objects.create(
+            username='search-staff', email='search-staff@example.com',
+            first_name='search-staff', last_name='search-staff',
+            is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/users/', {'search': term})
+        return len(queries)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.repeat = options['repeat']
+        try:
+            with transaction.atomic():
+                self.populate(options['users'], options['batch_size'])
+                for term in options['terms'] or self.default_terms():
+                    legacy = self.measure(
+                        SearchFilter(), LegacySearchView(), term)
+                    trigram = self.measure(UserSearchFilter(), None, term)
+                    self.stdout.write(
+                        f'{term!r:<18} SearchFilter {legacy[0]:>8.1f} мс '
+                        f'({legacy[1]} найдено), UserSearchFilter '
+                        f'{trigram[0]:>8.1f} мс ({trigram[1]} найдено'
+                        f'{self.uses_index(term)})')
+                self.stdout.write(
+                    'Запросов к БД на GET /api/users/?search=: '
+                    f'{self.endpoint_queries(term)}')
+                raise Rollback
+        except Rollback:
+            pass
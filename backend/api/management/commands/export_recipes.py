@@ -0,0 +1,81 @@
+import json
+import sys
+from collections import defaultdict
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import IngredientAmount, Recipe, Tag
+
+RECIPE_FIELDS = ('id', 'name', 'text', 'cooking_time', 'image',
+                 'author__email', 'author__username', 'author__first_name',
+                 'author__last_name')
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты в NDJSON: одна строка на рецепт с автором, '
+            'тегами, ингредиентами и путем к картинке.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='файл для записи, по умолчанию stdout')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def related(self, recipe_ids, tags):
+        """Теги и ингредиенты для пачки рецептов двумя запросами."""
+        recipe_tags = defaultdict(list)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id', 'tag_id'):
+            recipe_tags[recipe_id].append(tags[tag_id])
+        ingredients = defaultdict(list)
+        for recipe_id, name, unit, amount in IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+            'amount'
+        ):
+            ingredients[recipe_id].append(
+                {'name': name, 'measurement_unit': unit, 'amount': amount})
+        return recipe_tags, ingredients
+
+    def lines(self, batch_size):
+        tags = {tag['id']: {'name': tag['name'], 'color': tag['color'],
+                            'slug': tag['slug']}
+                for tag in Tag.objects.values('id', 'name', 'color', 'slug')}
+        rows = Recipe.objects.order_by('id').values(
+            *RECIPE_FIELDS).iterator(chunk_size=batch_size)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            recipe_tags, ingredients = self.related(
+                [row['id'] for row in batch], tags)
+            for row in batch:
+                yield json.dumps({
+                    'name': row['name'],
+                    'text': row['text'],
+                    'cooking_time': row['cooking_time'],
+                    'image': row['image'],
+                    'author': {
+                        'email': row['author__email'],
+                        'username': row['author__username'],
+                        'first_name': row['author__first_name'],
+                        'last_name': row['author__last_name'],
+                    },
+                    'tags': recipe_tags[row['id']],
+                    'ingredients': ingredients[row['id']],
+                }, ensure_ascii=False) + '\n'
+
+    def handle(self, *args, **options):
+        output = options['output']
+        stream = (sys.stdout if output == '-'
+                  else open(output, 'w', encoding='utf-8'))
+        count = 0
+        try:
+            for line in self.lines(options['batch_size']):
+                stream.write(line)
+                count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(f'Выгружено рецептов: {count}.')
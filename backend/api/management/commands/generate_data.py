@@ -0,0 +1,199 @@
+import random
+from bisect import bisect
+from itertools import accumulate, islice
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api import feed
+from api.cache import GLOBAL, recipe_cache
+from api.cooking import COOKING
+from api.search import INGREDIENTS
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingСart, Subscribe, Tag)
+from users.models import CustomUser
+
+IMAGE = 'recipes/images/generated.png'
+
+
+class Zipf:
+    """Выбор элементов с вероятностью, обратной степени ранга."""
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = list(items)
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def choice(self):
+        point = self.rng.random() * self.weights[-1]
+        return self.items[min(bisect(self.weights, point),
+                              len(self.items) - 1)]
+
+    def sample(self, count, exclude=None):
+        """До count различных элементов, популярные выпадают чаще."""
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+        for _ in range(count * 10):
+            if len(chosen) >= count:
+                break
+            item = self.choice()
+            if item != exclude:
+                chosen.add(item)
+        return chosen
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочного '
+            'тестирования. Популярность авторов, рецептов и ингредиентов '
+            'распределена по Ципфу, результат определяется --seed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=20)
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='сколько создать, если каталог пуст')
+        parser.add_argument('--ingredients-per-recipe', type=int, nargs=2,
+                            default=[3, 15], metavar=('MIN', 'MAX'))
+        parser.add_argument('--subscriptions', type=float, default=5,
+                            help='в среднем подписок на пользователя')
+        parser.add_argument('--favorites', type=float, default=20,
+                            help='в среднем избранного на пользователя')
+        parser.add_argument('--cart', type=float, default=3,
+                            help='в среднем рецептов в корзине')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='показатель степени распределения Ципфа')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='load',
+                            help='префикс имен пользователей и рецептов')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def insert(self, model, objects, key):
+        """Вставляет объекты из генератора пачками и возвращает их id."""
+        ids = []
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            batch = model.objects.bulk_create(batch)
+            if batch[0].pk is None:
+                values = [getattr(obj, key) for obj in batch]
+                found = dict(model.objects.filter(
+                    **{f'{key}__in': values}).values_list(key, 'id'))
+                ids += [found[value] for value in values]
+            else:
+                ids += [obj.pk for obj in batch]
+        self.counts[model._meta.db_table] = len(ids)
+        return ids
+
+    def stream(self, model, rows):
+        """Вставляет строки из генератора, не держа их все в памяти."""
+        batch = []
+        total = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                model.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        self.counts[model._meta.db_table] = total
+
+    def per_user(self, average):
+        return round(self.rng.expovariate(1 / average)) if average else 0
+
+    def create_users(self, count, prefix):
+        password = make_password(f'{prefix}-password')
+        return self.insert(CustomUser, (
+            CustomUser(username=f'{prefix}{index}',
+                       email=f'{prefix}{index}@example.com',
+                       first_name=f'{prefix} имя {index}',
+                       last_name=f'{prefix} фамилия {index}',
+                       password=password)
+            for index in range(count)), 'username')
+
+    def create_tags(self, count, prefix):
+        return self.insert(Tag, (
+            Tag(name=f'{prefix} тег {index}', slug=f'{prefix}-{index}',
+                color=f'#{self.rng.randrange(0x1000000):06X}')
+            for index in range(count)), 'slug')
+
+    def ingredient_ids(self, count, prefix):
+        ids = list(Ingredient.objects.values_list('id', flat=True))
+        if ids:
+            return ids
+        return self.insert(Ingredient, (
+            Ingredient(name=f'{prefix} ингредиент {index}',
+                       measurement_unit=self.rng.choice(('г', 'мл', 'шт.')))
+            for index in range(count)), 'name')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if CustomUser.objects.filter(username=f'{prefix}0').exists():
+            raise CommandError(
+                f'Данные с префиксом {prefix} уже есть, укажите --prefix.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.counts = {}
+        started = perf_counter()
+        exponent = options['zipf']
+
+        user_ids = self.create_users(options['users'], prefix)
+        tag_ids = self.create_tags(options['tags'], prefix)
+        ingredient_ids = self.ingredient_ids(options['ingredients'], prefix)
+        for ids in (user_ids, tag_ids, ingredient_ids):
+            self.rng.shuffle(ids)
+        authors = Zipf(self.rng, user_ids, exponent)
+        tags = Zipf(self.rng, tag_ids, exponent)
+        ingredients = Zipf(self.rng, ingredient_ids, exponent)
+
+        recipe_ids = self.insert(Recipe, (
+            Recipe(author_id=authors.choice(), name=f'{prefix} рецепт {index}',
+                   text=f'Описание рецепта {index}', image=IMAGE,
+                   cooking_time=self.rng.randint(5, 180))
+            for index in range(options['recipes'])), 'name')
+        low, high = options['ingredients_per_recipe']
+        self.stream(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in tags.sample(self.rng.randint(1, 3))))
+        self.stream(IngredientAmount, (
+            IngredientAmount(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=self.rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredients.sample(
+                self.rng.randint(low, high))))
+
+        popular = list(recipe_ids)
+        self.rng.shuffle(popular)
+        recipes = Zipf(self.rng, popular, exponent)
+        self.stream(Subscribe, (
+            Subscribe(follower_id=user_id, following_id=author_id)
+            for user_id in user_ids
+            for author_id in authors.sample(
+                self.per_user(options['subscriptions']), exclude=user_id)))
+        self.stream(Favorite, (
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.sample(
+                self.per_user(options['favorites']))))
+        self.stream(ShoppingСart, (
+            ShoppingСart(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.sample(self.per_user(options['cart']))))
+
+        call_command('reconcile_counters', stdout=self.stdout)
+        feed.publish_pending(
+            Recipe.objects.filter(name__startswith=f'{prefix} рецепт '))
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        recipe_cache.bump((INGREDIENTS, GLOBAL, COOKING))
+        for name, count in self.counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {perf_counter() - started:.1f} с.'))
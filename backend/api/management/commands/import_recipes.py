@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+from collections import Counter, OrderedDict
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from api import feed
+from api.cache import GLOBAL, recipe_cache
+from api.cooking import COOKING
+from api.search import INGREDIENTS
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from users.constants import MAX_LENGHT
+from users.models import CustomUser
+
+# Сколько ключей каждый Lookup хранит между пачками.
+LOOKUP_SIZE = 10000
+AUTHOR_UNIQUE_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def read_batches(file, batch_size):
+    """Пачки (рецепты, смещение после пачки) из NDJSON-файла."""
+    batch = []
+    for line in iter(file.readline, ''):
+        if not line.strip():
+            continue
+        try:
+            batch.append(json.loads(line))
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Некорректная строка NDJSON: {error}')
+        if len(batch) == batch_size:
+            yield batch, file.tell()
+            batch = []
+    if batch:
+        yield batch, file.tell()
+
+
+class Lookup:
+    """Словарь ключ -> id, дополняемый из базы только недостающими ключами.
+
+    Отсутствующие в базе объекты создаются одним bulk_create. Между
+    пачками хранятся LOOKUP_SIZE последних использованных ключей.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.ids = OrderedDict()
+
+    def key(self, data):
+        return tuple(data[field] for field in self.fields)
+
+    def fetch(self, keys):
+        first = self.fields[0]
+        for row in self.model.objects.filter(**{
+            f'{first}__in': {key[0] for key in keys}
+        }).values_list(*self.fields, 'id'):
+            self.ids[tuple(row[:-1])] = row[-1]
+
+    def resolve(self, items, build):
+        missing = {self.key(item): item for item in items
+                   if self.key(item) not in self.ids}
+        if missing:
+            self.fetch(missing)
+        new = [build(item) for key, item in missing.items()
+               if key not in self.ids]
+        if new:
+            self.create(new)
+            self.fetch(missing)
+        unresolved = [key for key in missing if key not in self.ids]
+        if unresolved:
+            raise CommandError(
+                f'Не удалось создать {self.model.__name__}: {unresolved[0]}')
+        ids = [self.ids[self.key(item)] for item in items]
+        self.trim(items)
+        return ids
+
+    def create(self, objects):
+        self.model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def trim(self, items):
+        for item in items:
+            self.ids.move_to_end(self.key(item))
+        while len(self.ids) > LOOKUP_SIZE:
+            self.ids.popitem(last=False)
+
+
+def unique_value(value, email):
+    suffix = hashlib.sha1(email.encode()).hexdigest()[:8]
+    return f'{value[:MAX_LENGHT - len(suffix) - 1]}-{suffix}'
+
+
+class AuthorLookup(Lookup):
+    """Авторы по email.
+
+    Имя пользователя, имя и фамилия тоже уникальны: занятые другими
+    пользователями значения получают суффикс от email, иначе строка
+    автора не вставилась бы и не нашлась по email.
+    """
+
+    def __init__(self):
+        super().__init__(CustomUser, ('email',))
+
+    def create(self, authors):
+        for field in AUTHOR_UNIQUE_FIELDS:
+            seen = set(CustomUser.objects.filter(**{
+                f'{field}__in': [getattr(author, field) for author in authors]
+            }).values_list(field, flat=True))
+            for author in authors:
+                if getattr(author, field) in seen:
+                    setattr(author, field, unique_value(
+                        getattr(author, field), author.email))
+                seen.add(getattr(author, field))
+        super().create(authors)
+
+
+def build_author(data):
+    author = CustomUser(
+        email=data['email'], username=data['username'],
+        first_name=data['first_name'], last_name=data['last_name'])
+    author.set_unusable_password()
+    return author
+
+
+def build_tag(data):
+    return Tag(name=data['name'], color=data['color'], slug=data['slug'])
+
+
+def build_ingredient(data):
+    return Ingredient(name=data['name'],
+                      measurement_unit=data['measurement_unit'])
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из NDJSON, выгруженного export_recipes. '
+            'После каждой пачки сохраняется контрольная точка, прерванный '
+            'импорт продолжается с нее. Рецепты, у автора которых уже есть '
+            'рецепт с таким названием, пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--checkpoint',
+                            help='файл контрольной точки, по умолчанию '
+                                 '<path>.checkpoint')
+        parser.add_argument('--restart', action='store_true',
+                            help='начать с начала, игнорируя контрольную '
+                                 'точку')
+
+    def read_checkpoint(self, path):
+        if not os.path.exists(path):
+            return 0, 0
+        with open(path, encoding='utf-8') as file:
+            state = json.load(file)
+        return state['offset'], state['imported']
+
+    def write_checkpoint(self, path, offset, imported):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump({'offset': offset, 'imported': imported}, file)
+        os.replace(temporary, path)
+
+    def existing(self, author_ids, names):
+        return set(Recipe.objects.filter(
+            author_id__in=author_ids, name__in=names
+        ).values_list('author_id', 'name'))
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        author_ids = self.authors.resolve(
+            [item['author'] for item in batch], build_author)
+        existing = self.existing(set(author_ids),
+                                 {item['name'] for item in batch})
+        unique = []
+        for author_id, item in zip(author_ids, batch):
+            if (author_id, item['name']) not in existing:
+                existing.add((author_id, item['name']))
+                unique.append((author_id, item))
+        batch = unique
+        if not batch:
+            return 0
+        tag_ids = self.tags.resolve(
+            [tag for _, item in batch for tag in item['tags']], build_tag)
+        ingredient_ids = self.ingredients.resolve(
+            [ingredient for _, item in batch
+             for ingredient in item['ingredients']], build_ingredient)
+        Recipe.objects.bulk_create(
+            Recipe(author_id=author_id, name=item['name'], text=item['text'],
+                   cooking_time=item['cooking_time'], image=item['image'])
+            for author_id, item in batch)
+        recipe_ids = {
+            (author_id, name): recipe_id
+            for author_id, name, recipe_id in Recipe.objects.filter(
+                author_id__in={author_id for author_id, _ in batch},
+                name__in={item['name'] for _, item in batch},
+            ).values_list('author_id', 'name', 'id')}
+        tags = iter(tag_ids)
+        ingredients = iter(ingredient_ids)
+        recipe_tags = []
+        amounts = []
+        for author_id, item in batch:
+            recipe_id = recipe_ids[author_id, item['name']]
+            recipe_tags += [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=next(tags))
+                for _ in item['tags']]
+            amounts += [
+                IngredientAmount(recipe_id=recipe_id,
+                                 ingredient_id=next(ingredients),
+                                 amount=ingredient['amount'])
+                for ingredient in item['ingredients']]
+        Recipe.tags.through.objects.bulk_create(recipe_tags,
+                                                ignore_conflicts=True)
+        IngredientAmount.objects.bulk_create(amounts)
+        for author_id, count in Counter(
+                author_id for author_id, _ in batch).items():
+            CustomUser.objects.filter(id=author_id).update(
+                recipes_count=F('recipes_count') + count)
+        feed.publish_pending(
+            Recipe.objects.filter(id__in=recipe_ids.values()))
+        return len(batch)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        offset, imported = self.read_checkpoint(checkpoint)
+        if offset:
+            self.stdout.write(f'Продолжение с контрольной точки: '
+                              f'импортировано {imported} рецептов.')
+        self.authors = AuthorLookup()
+        self.tags = Lookup(Tag, ('slug',))
+        self.ingredients = Lookup(Ingredient, ('name', 'measurement_unit'))
+        started = perf_counter()
+        read = 0
+        with open(path, encoding='utf-8') as file:
+            file.seek(offset)
+            for batch, offset in read_batches(file, options['batch_size']):
+                imported += self.import_batch(batch)
+                read += len(batch)
+                self.write_checkpoint(checkpoint, offset, imported)
+                self.stdout.write(
+                    f'Прочитано {read}, импортировано всего {imported}, '
+                    f'{read / (perf_counter() - started):.0f} рецептов/с')
+        recipe_cache.bump((INGREDIENTS, GLOBAL, COOKING))
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен, импортировано рецептов: {imported}.'))
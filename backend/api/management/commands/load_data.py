@@ -1,28 +1,123 @@
+import json
+import os
+import re
 from csv import DictReader
+from itertools import islice
+from time import perf_counter
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from api.cache import GLOBAL, recipe_cache
+from api.search import INGREDIENTS
+from recipes.constants import MAX_LENGHT
 from recipes.models import Ingredient
 
+DEFAULT_PATH = 'recipes/data/ingredients.csv'
+READ_SIZE = 64 * 1024
+SEPARATOR = re.compile(r'[\s,]*')
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        yield from DictReader(file)
+
+
+def read_json(path):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as file:
+        buffer = file.read(READ_SIZE).lstrip()
+        if not buffer.startswith('['):
+            raise CommandError('Ожидается JSON-массив.')
+        position = 1
+        while True:
+            position = SEPARATOR.match(buffer, position).end()
+            if buffer.startswith(']', position):
+                return
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    raise CommandError('JSON-файл оборван.')
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield row
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON пачками. Уже '
+            'существующие пары (название, единица) пропускаются, поэтому '
+            'команду можно запускать повторно для обновления каталога.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только посчитать новые ингредиенты')
+
+    def clean(self, batch):
+        """Уникальные корректные пары из пачки и число отброшенных строк."""
+        pairs = {}
+        for row in batch:
+            name = (row.get('name') or '').strip()
+            unit = (row.get('measurement_unit') or '').strip()
+            if name and unit and max(len(name), len(unit)) <= MAX_LENGHT:
+                pairs.setdefault((name, unit), None)
+        return list(pairs), len(batch) - len(pairs)
+
+    def load_batch(self, pairs, dry_run):
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in pairs}
+        ).values_list('name', 'measurement_unit'))
+        new = [pair for pair in pairs if pair not in existing]
+        if new and not dry_run:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in new), ignore_conflicts=True)
+        return len(new)
+
+    def report(self, rows, created, started):
+        elapsed = perf_counter() - started
+        self.stdout.write(
+            f'Обработано {rows} строк, новых {created}, '
+            f'{rows / elapsed if elapsed else 0:.0f} строк/с')
 
     def handle(self, *args, **options):
-        if Ingredient.objects.exists():
-            print('Данные уже загружены!')
-            return
-        print('Загрузка данных ингридиентов')
-
-        try:
-            with open('recipes/data/ingredients.csv', encoding='utf-8') as f:
-                reader = DictReader(f)
-                for row in reader:
-                    obj, created = Ingredient.objects.get_or_create(
-                        name=row['name'],
-                        measurement_unit=row['measurement_unit']
-                    )
-                print('Загрузка ингредиентов прошла успешно.')
-        except FileNotFoundError:
-            print('CSV file не найден.')
-        except Exception as error:
-            print(f'Произошла ошибка {str(error)}')
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        dry_run = options['dry_run']
+        rows = created = skipped = 0
+        started = last_report = perf_counter()
+        for batch in batches(reader(path), options['batch_size']):
+            pairs, rejected = self.clean(batch)
+            created += self.load_batch(pairs, dry_run)
+            rows += len(batch)
+            skipped += rejected
+            if perf_counter() - last_report >= 1:
+                self.report(rows, created, started)
+                last_report = perf_counter()
+        if created and not dry_run:
+            recipe_cache.bump((INGREDIENTS, GLOBAL))
+        self.report(rows, created, started)
+        action = 'Будет добавлено' if dry_run else 'Добавлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} ингредиентов: {created}, пропущено строк '
+            f'(дубли и некорректные): {skipped}.'))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.shopping_list import compute_totals, stored_totals
+from recipes.models import ShoppingListItem
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает списки покупок пользователей по корзинам '
+            'или, с флагом --verify, только сверяет их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='только сравнить с расчетом по корзинам')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def user_batches(self, batch_size):
+        user_ids = CustomUser.objects.order_by('id').values_list(
+            'id', flat=True)
+        last_id = 0
+        while True:
+            batch = list(user_ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
+
+    def mismatched(self, user_ids):
+        """Пользователи, чей список покупок расходится с корзиной, и
+        суммы, посчитанные по корзинам."""
+        expected = compute_totals(user_ids)
+        stored = stored_totals(user_ids)
+        mismatched_users = {user_id
+                            for user_id, _ in set(expected) ^ set(stored)}
+        mismatched_users.update(
+            user_id for (user_id, ingredient_id), amount in expected.items()
+            if stored.get((user_id, ingredient_id)) not in (None, amount))
+        return mismatched_users, expected
+
+    def rebuild(self, user_ids):
+        """Пересчитывает списки под блокировкой строк пользователей,
+        чтобы параллельный apply_deltas не затерся старыми суммами."""
+        with transaction.atomic():
+            list(CustomUser.objects.select_for_update().filter(
+                id__in=user_ids).order_by('id').values_list('id', flat=True))
+            mismatched_users, expected = self.mismatched(user_ids)
+            ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                                 amount=amount)
+                for (user_id, ingredient_id), amount in expected.items())
+        return mismatched_users
+
+    def handle(self, *args, **options):
+        mismatched_users = set()
+        for user_ids in self.user_batches(options['batch_size']):
+            if options['verify']:
+                mismatched_users.update(self.mismatched(user_ids)[0])
+            else:
+                mismatched_users.update(self.rebuild(user_ids))
+        if options['verify'] and mismatched_users:
+            raise CommandError(
+                f'Расхождения в списках покупок у {len(mismatched_users)} '
+                f'пользователей.')
+        action = 'Проверено' if options['verify'] else 'Пересчитано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}. Пользователей с расхождениями: '
+            f'{len(mismatched_users)}.'))
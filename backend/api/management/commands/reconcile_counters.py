@@ -0,0 +1,62 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, Subscribe
+from users.models import CustomUser
+
+
+def count(model, field):
+    """Число строк model, ссылающихся на текущий объект через field."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счетчики избранного, рецептов и подписчиков '
+            'с данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать число расхождений')
+
+    def reconcile(self, model, counters, batch_size, dry_run):
+        """Обходит таблицу по id и пересчитывает неверные счетчики.
+
+        Значение вычисляется подзапросом в самом UPDATE, поэтому
+        изменения через F(), зафиксированные во время сверки, не теряются.
+        """
+        actual = {field: count(*source) for field, source in counters.items()}
+        mismatched = reduce(or_, (~Q(**{field: value})
+                                  for field, value in actual.items()))
+        fixed = 0
+        last_id = 0
+        while True:
+            ids = list(model.objects.filter(id__gt=last_id).order_by(
+                'id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return fixed
+            last_id = ids[-1]
+            batch = model.objects.filter(
+                id__gte=ids[0], id__lte=last_id).filter(mismatched)
+            fixed += batch.count() if dry_run else batch.update(**actual)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        recipes = self.reconcile(
+            Recipe, {'favorites_count': (Favorite, 'recipe')},
+            batch_size, dry_run)
+        users = self.reconcile(
+            CustomUser, {'recipes_count': (Recipe, 'author'),
+                         'followers_count': (Subscribe, 'following')},
+            batch_size, dry_run)
+        action = 'Найдено' if dry_run else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений: рецептов {recipes}, '
+            f'пользователей {users}.'))
@@ -0,0 +1,118 @@
+import os
+from functools import lru_cache
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from .timing import view_name, wrap_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    """Метрики процесса; prometheus_client импортируется только при
+    включенном METRICS.
+
+    Для нескольких воркеров gunicorn переменная PROMETHEUS_MULTIPROC_DIR
+    должна быть задана до запуска: значения пишутся в файлы этого
+    каталога и суммируются при чтении.
+    """
+    from prometheus_client import Counter, Histogram
+
+    return {
+        'latency': Histogram(
+            'http_request_duration_seconds', 'Время обработки запроса.',
+            ('view', 'method', 'status'), buckets=LATENCY_BUCKETS),
+        'queries': Histogram(
+            'http_request_db_queries', 'Число SQL-запросов на запрос.',
+            ('view',), buckets=QUERY_BUCKETS),
+        'cache': Counter(
+            'recipe_cache_requests', 'Обращения к кешу рецептов.',
+            ('result',)),
+    }
+
+
+def record_cache(hit):
+    if settings.METRICS:
+        get_metrics()['cache'].labels('hit' if hit else 'miss').inc()
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Записывает время ответа и число SQL-запросов по view и статусу."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.metrics = get_metrics()
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = perf_counter()
+        with wrap_queries(counter):
+            response = self.get_response(request)
+        name = view_name(request) or 'unknown'
+        self.metrics['latency'].labels(
+            name, request.method, response.status_code
+        ).observe(perf_counter() - started)
+        self.metrics['queries'].labels(name).observe(counter.count)
+        return response
+
+
+class CacheRatioCollector:
+    """Доля попаданий в кеш рецептов по сумме всех воркеров."""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        totals = {'hit': 0, 'miss': 0}
+        for metric in self.registry.collect():
+            if metric.name != 'recipe_cache_requests':
+                continue
+            for sample in metric.samples:
+                if sample.name.endswith('_total'):
+                    totals[sample.labels['result']] += sample.value
+        requests = totals['hit'] + totals['miss']
+        ratio = GaugeMetricFamily(
+            'recipe_cache_hit_ratio', 'Доля попаданий в кеш рецептов.')
+        ratio.add_metric([], totals['hit'] / requests if requests else 0)
+        yield ratio
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not settings.METRICS:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                                   CollectorRegistry, generate_latest)
+    from prometheus_client.multiprocess import MultiProcessCollector
+
+    get_metrics()
+    source = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        source = CollectorRegistry()
+        MultiProcessCollector(source)
+    registry = CollectorRegistry()
+    registry.register(CacheRatioCollector(source))
+    return HttpResponse(generate_latest(source) + generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
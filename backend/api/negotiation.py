@@ -0,0 +1,12 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class FirstRendererNegotiation(DefaultContentNegotiation):
+    """Выбирает первый рендерер, не занимая параметр ?format=.
+
+    Нужен представлениям, которые сами используют ?format= и отдают
+    ответ в обход рендереров DRF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -1,6 +1,187 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPaginator(BasePagination):
+    """Keyset-пагинация по составному ключу без COUNT и OFFSET.
+
+    Ключ строится из полей сортировки модели с добавлением id, поэтому
+    для него должен существовать соответствующий индекс.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+    # Значения ключа: id, строки, числа и даты в ISO-формате.
+    cursor_value_types = (str, int, float)
+    max_cursor_int = 2 ** 63
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_key_fields(self, queryset):
+        fields = tuple(queryset.query.order_by
+                       or queryset.model._meta.ordering)
+        if not {'id', '-id', 'pk', '-pk'} & set(fields):
+            fields += ('id',)
+        return fields
+
+    def decode_cursor(self, request):
+        """Курсор - base64 от JSON [reverse, [значения ключа]].
+
+        Проверяется, что значений столько же, сколько полей ключа, и что
+        это скаляры; иначе курсор считается неверным (404).
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not (isinstance(payload, list) and len(payload) == 2
+                and isinstance(payload[1], list)
+                and len(payload[1]) == len(self.fields)
+                and all(self.valid_cursor_value(value)
+                        for value in payload[1])):
+            raise NotFound(self.invalid_cursor_message)
+        reverse, values = payload
+        return values, bool(reverse)
+
+    def valid_cursor_value(self, value):
+        if isinstance(value, bool) or not isinstance(
+                value, self.cursor_value_types):
+            return False
+        if isinstance(value, float):
+            return math.isfinite(value)
+        return not isinstance(value, int) or abs(value) < self.max_cursor_int
+
+    def encode_cursor(self, obj, reverse):
+        names = [field.lstrip('-') for field in self.fields]
+        if isinstance(obj, dict):
+            values = [obj[name] for name in names]
+        else:
+            values = [getattr(obj, name) for name in names]
+        encoded = urlsafe_b64encode(json.dumps(
+            [int(reverse), values], default=str).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encoded.decode('ascii'))
+
+    def get_ordering(self, reverse):
+        if not reverse:
+            return self.fields
+        return tuple(field[1:] if field.startswith('-') else f'-{field}'
+                     for field in self.fields)
+
+    def filter_after(self, queryset, values, ordering):
+        conditions = []
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{field.lstrip("-")}__{lookup}': values[index]})
+            for previous, value in zip(ordering[:index], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            conditions.append(condition)
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        bound = Q(**{f'{first.lstrip("-")}__{lookup}': values[0]})
+        return queryset.filter(bound).filter(reduce(or_, conditions))
+
+    def fetch(self, queryset, values, ordering):
+        """Страница после ключа values плюс одна строка."""
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            try:
+                queryset = self.filter_after(queryset, values, ordering)
+            except (TypeError, ValueError, ValidationError):
+                # Значение не приводится к типу поля ключа.
+                raise NotFound(self.invalid_cursor_message)
+        return list(queryset[:self.page_size + 1])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.fields = self.get_key_fields(queryset)
+        values, reverse = self.decode_cursor(request)
+        ordering = self.get_ordering(reverse)
+        results = self.fetch(queryset, values, ordering)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+        has_next = has_more if not reverse else values is not None
+        has_previous = values is not None if not reverse else has_more
+
+        self.next_link = (self.encode_cursor(results[-1], False)
+                          if results and has_next else None)
+        self.previous_link = None
+        if results and has_previous:
+            self.previous_link = self.encode_cursor(results[0], True)
+        elif values is not None and not reverse:
+            self.previous_link = remove_query_param(
+                self.base_url, self.cursor_query_param)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next_link,
+            'previous': self.previous_link,
+            'results': data,
+        })
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """Keyset-пагинация по объединению нескольких querysets.
+
+    Querysets сортируются по одинаковому ключу в одном направлении и не
+    пересекаются; каждый отдает не больше страницы, а страницы сливаются
+    в памяти. paginate_queryset принимает последовательность querysets.
+    """
+
+    def get_key_fields(self, querysets):
+        return super().get_key_fields(querysets[0])
+
+    def fetch(self, querysets, values, ordering):
+        names = [field.lstrip('-') for field in ordering]
+        fetch = super().fetch
+        rows = [row for queryset in querysets
+                for row in fetch(queryset, values, ordering)]
+        rows.sort(key=lambda row: [row[name] for name in names],
+                  reverse=ordering[0].startswith('-'))
+        return rows[:self.page_size + 1]
 
 
 class CustomPaginator(PageNumberPagination):
-    """Кастомная пагинация."""
+    """Кастомная пагинация.
+
+    Если в запросе передан параметр cursor (пустой для первой страницы),
+    используется keyset-пагинация без подсчета общего количества.
+    """
     page_size_query_param = 'limit'
+    keyset_class = KeysetPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
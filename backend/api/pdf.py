@@ -0,0 +1,331 @@
+import os
+import struct
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 16
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+# Таблицы, которые нужны для вывода глифов шрифта CIDFontType2 в PDF.
+SUBSET_TABLES = ('cvt ', 'fpgm', 'glyf', 'head', 'hhea', 'hmtx', 'loca',
+                 'maxp', 'prep')
+# Флаги составного глифа в таблице glyf.
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+def read_tables(data):
+    """Каталог таблиц шрифта: тег -> (смещение, длина)."""
+    num_tables, = struct.unpack_from('>H', data, 4)
+    tables = {}
+    for index in range(num_tables):
+        tag, _, offset, length = struct.unpack_from(
+            '>4sIII', data, 12 + 16 * index)
+        tables[tag.decode('latin-1')] = offset, length
+    return tables
+
+
+def checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+class TrueTypeFont:
+    """Минимальный разбор TrueType-шрифта для встраивания в PDF.
+
+    Читаются только таблицы, нужные для отображения текста: cmap
+    (символ -> глиф), hmtx (ширины глифов) и head (размер em).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as font_file:
+            data = font_file.read()
+        self.name = os.path.splitext(os.path.basename(path))[0].replace(
+            ' ', '')
+        tables = {tag: offset
+                  for tag, (offset, _) in read_tables(data).items()}
+        units_per_em, = struct.unpack_from('>H', data, tables['head'] + 18)
+        self.scale = 1000 / units_per_em
+        num_metrics, = struct.unpack_from('>H', data, tables['hhea'] + 34)
+        self.widths = struct.unpack_from(
+            f'>{num_metrics * 2}H', data, tables['hmtx'])[::2]
+        self.cmap = self.parse_cmap(data, tables['cmap'])
+
+    def parse_cmap(self, data, offset):
+        num_subtables, = struct.unpack_from('>H', data, offset + 2)
+        for index in range(num_subtables):
+            platform, encoding, sub_offset = struct.unpack_from(
+                '>HHI', data, offset + 4 + 8 * index)
+            start = offset + sub_offset
+            fmt, = struct.unpack_from('>H', data, start)
+            if fmt == 4 and (platform, encoding) in ((3, 1), (0, 3)):
+                return self.parse_format4(data, start)
+        return {}
+
+    def parse_format4(self, data, start):
+        segments = struct.unpack_from('>H', data, start + 6)[0] // 2
+        ends_at = start + 14
+        starts_at = ends_at + 2 * segments + 2
+        deltas_at = starts_at + 2 * segments
+        ranges_at = deltas_at + 2 * segments
+        ends = struct.unpack_from(f'>{segments}H', data, ends_at)
+        starts = struct.unpack_from(f'>{segments}H', data, starts_at)
+        deltas = struct.unpack_from(f'>{segments}h', data, deltas_at)
+        ranges = struct.unpack_from(f'>{segments}H', data, ranges_at)
+        cmap = {}
+        for index in range(segments):
+            for code in range(starts[index], ends[index] + 1):
+                if code == 0xFFFF:
+                    continue
+                if ranges[index]:
+                    position = (ranges_at + 2 * index + ranges[index]
+                                + 2 * (code - starts[index]))
+                    glyph, = struct.unpack_from('>H', data, position)
+                    if glyph:
+                        glyph = (glyph + deltas[index]) & 0xFFFF
+                else:
+                    glyph = (code + deltas[index]) & 0xFFFF
+                if glyph:
+                    cmap[code] = glyph
+        return cmap
+
+    def glyph(self, char):
+        return self.cmap.get(ord(char), 0)
+
+    def width(self, glyph):
+        widths = self.widths
+        return round(widths[min(glyph, len(widths) - 1)] * self.scale)
+
+    def subset(self, glyphs):
+        """Шрифт только с контурами указанных глифов.
+
+        Номера глифов сохраняются (в PDF указан CIDToGIDMap /Identity),
+        контуры остальных глифов и таблицы, не нужные для вывода,
+        удаляются.
+        """
+        with open(self.path, 'rb') as font_file:
+            data = font_file.read()
+        tables = read_tables(data)
+        head = tables['head'][0]
+        num_glyphs, = struct.unpack_from('>H', data, tables['maxp'][0] + 4)
+        loca = tables['loca'][0]
+        if struct.unpack_from('>h', data, head + 50)[0]:
+            offsets = struct.unpack_from(f'>{num_glyphs + 1}I', data, loca)
+        else:
+            offsets = [2 * offset for offset in struct.unpack_from(
+                f'>{num_glyphs + 1}H', data, loca)]
+        glyf = tables['glyf'][0]
+        keep = self.with_components(data, glyf, offsets, glyphs)
+        outlines = bytearray()
+        new_offsets = []
+        for glyph in range(num_glyphs):
+            new_offsets.append(len(outlines))
+            if glyph in keep:
+                outlines += data[glyf + offsets[glyph]:
+                                 glyf + offsets[glyph + 1]]
+                outlines += b'\0' * (-len(outlines) % 4)
+        new_offsets.append(len(outlines))
+        subset = {tag: data[offset:offset + length]
+                  for tag, (offset, length) in tables.items()
+                  if tag in SUBSET_TABLES}
+        subset['glyf'] = bytes(outlines)
+        subset['loca'] = struct.pack(f'>{num_glyphs + 1}I', *new_offsets)
+        head_table = bytearray(subset['head'])
+        # Длинный формат loca, checkSumAdjustment считается заново.
+        struct.pack_into('>I', head_table, 8, 0)
+        struct.pack_into('>h', head_table, 50, 1)
+        subset['head'] = bytes(head_table)
+        return self.build(subset)
+
+    def with_components(self, data, glyf, offsets, glyphs):
+        """Глифы вместе с компонентами составных глифов."""
+        keep = set(glyphs) | {0}
+        pending = list(keep)
+        while pending:
+            glyph = pending.pop()
+            if offsets[glyph + 1] == offsets[glyph]:
+                continue
+            position = glyf + offsets[glyph]
+            contours, = struct.unpack_from('>h', data, position)
+            if contours >= 0:
+                continue
+            position += 10
+            flags = MORE_COMPONENTS
+            while flags & MORE_COMPONENTS:
+                flags, component = struct.unpack_from('>HH', data, position)
+                if component not in keep:
+                    keep.add(component)
+                    pending.append(component)
+                position += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+                if flags & WE_HAVE_A_SCALE:
+                    position += 2
+                elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                    position += 4
+                elif flags & WE_HAVE_A_TWO_BY_TWO:
+                    position += 8
+        return keep
+
+    def build(self, tables):
+        """Собирает файл шрифта из таблиц."""
+        count = len(tables)
+        power = 1 << (count.bit_length() - 1)
+        header = struct.pack('>IHHHH', 0x00010000, count, power * 16,
+                             power.bit_length() - 1, (count - power) * 16)
+        directory = []
+        body = []
+        offsets = {}
+        offset = len(header) + 16 * count
+        for tag, table in sorted(tables.items()):
+            directory.append(struct.pack('>4sIII', tag.encode('latin-1'),
+                                         checksum(table), offset, len(table)))
+            offsets[tag] = offset
+            table += b'\0' * (-len(table) % 4)
+            body.append(table)
+            offset += len(table)
+        font = bytearray(header + b''.join(directory) + b''.join(body))
+        struct.pack_into('>I', font, offsets['head'] + 8,
+                         (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF)
+        return bytes(font)
+
+
+class StreamingPDF:
+    """Постраничная запись PDF-документа из строк текста.
+
+    Страницы отдаются по мере заполнения, в памяти хранятся только
+    смещения объектов для таблицы xref и набор использованных глифов.
+    В конце документа встраивается подмножество шрифта с этими глифами.
+    """
+
+    CATALOG, PAGES, FONT, CID_FONT, DESCRIPTOR, FONT_FILE, TO_UNICODE = (
+        range(1, 8))
+
+    def __init__(self, font):
+        self.font = font
+        self.offsets = {}
+        self.position = 0
+        self.next_number = self.TO_UNICODE + 1
+        self.pages = []
+        self.glyphs = {}
+
+    def write(self, data):
+        self.position += len(data)
+        return data
+
+    def start_object(self, number):
+        self.offsets[number] = self.position
+        return self.write(f'{number} 0 obj\n'.encode('ascii'))
+
+    def object(self, number, body):
+        return (self.start_object(number)
+                + self.write(body.encode('ascii') + b'\nendobj\n'))
+
+    def stream_object(self, number, content):
+        return (self.start_object(number)
+                + self.write(f'<< /Length {len(content)} >>\n'
+                             f'stream\n'.encode('ascii'))
+                + self.write(content)
+                + self.write(b'\nendstream\nendobj\n'))
+
+    def encode_line(self, line):
+        encoded = []
+        for char in line:
+            glyph = self.font.glyph(char)
+            self.glyphs.setdefault(glyph, char)
+            encoded.append(f'{glyph:04X}')
+        return ''.join(encoded)
+
+    def page(self, lines):
+        content = [f'BT /F1 {FONT_SIZE} Tf {LEADING} TL '
+                   f'{MARGIN} {PAGE_HEIGHT - MARGIN} Td']
+        content += [f'<{self.encode_line(line)}> Tj T*' for line in lines]
+        content.append('ET')
+        content_number = self.next_number
+        page_number = content_number + 1
+        self.next_number += 2
+        self.pages.append(page_number)
+        return (
+            self.stream_object(content_number,
+                               '\n'.join(content).encode('ascii'))
+            + self.object(page_number, (
+                f'<< /Type /Page /Parent {self.PAGES} 0 R '
+                f'/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                f'/Resources << /Font << /F1 {self.FONT} 0 R >> >> '
+                f'/Contents {content_number} 0 R >>')))
+
+    def to_unicode(self):
+        mappings = [f'<{glyph:04X}> <{ord(char):04X}>'
+                    for glyph, char in sorted(self.glyphs.items())
+                    if glyph and ord(char) <= 0xFFFF]
+        blocks = ''.join(
+            f'{len(mappings[start:start + 100])} beginbfchar\n'
+            + '\n'.join(mappings[start:start + 100]) + '\nendbfchar\n'
+            for start in range(0, len(mappings), 100))
+        return (
+            '/CIDInit /ProcSet findresource begin\n12 dict begin\n'
+            'begincmap\n/CIDSystemInfo << /Registry (Adobe) '
+            '/Ordering (UCS) /Supplement 0 >> def\n'
+            '/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n'
+            '1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n'
+            f'{blocks}endcmap\n'
+            'CMapName currentdict /CMap defineresource pop\n'
+            'end\nend').encode('ascii')
+
+    def font_objects(self):
+        font = self.font
+        widths = ' '.join(f'{glyph} [{font.width(glyph)}]'
+                          for glyph in sorted(self.glyphs))
+        yield self.object(self.FONT, (
+            f'<< /Type /Font /Subtype /Type0 /BaseFont /{font.name} '
+            f'/Encoding /Identity-H /DescendantFonts [{self.CID_FONT} 0 R] '
+            f'/ToUnicode {self.TO_UNICODE} 0 R >>'))
+        yield self.object(self.CID_FONT, (
+            f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{font.name} '
+            f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+            f'/Supplement 0 >> /FontDescriptor {self.DESCRIPTOR} 0 R '
+            f'/CIDToGIDMap /Identity /W [{widths}] >>'))
+        yield self.object(self.DESCRIPTOR, (
+            f'<< /Type /FontDescriptor /FontName /{font.name} /Flags 32 '
+            f'/FontBBox [-1000 -500 2000 1200] /ItalicAngle 0 '
+            f'/Ascent 900 /Descent -250 /CapHeight 700 /StemV 80 '
+            f'/FontFile2 {self.FONT_FILE} 0 R >>'))
+        font_file = font.subset(self.glyphs)
+        yield self.start_object(self.FONT_FILE)
+        yield self.write(f'<< /Length {len(font_file)} '
+                         f'/Length1 {len(font_file)} >>\n'
+                         f'stream\n'.encode('ascii'))
+        yield self.write(font_file)
+        yield self.write(b'\nendstream\nendobj\n')
+        yield self.stream_object(self.TO_UNICODE, self.to_unicode())
+
+    def render(self, lines):
+        """Генератор байтов PDF для итератора строк."""
+        yield self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self.object(self.CATALOG,
+                          f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>')
+        page = []
+        for line in lines:
+            page.append(line)
+            if len(page) == LINES_PER_PAGE:
+                yield self.page(page)
+                page = []
+        if page or not self.pages:
+            yield self.page(page)
+        kids = ' '.join(f'{number} 0 R' for number in self.pages)
+        yield self.object(self.PAGES, (
+            f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'))
+        yield from self.font_objects()
+        xref_position = self.position
+        size = self.next_number
+        yield f'xref\n0 {size}\n0000000000 65535 f \n'.encode('ascii')
+        for start in range(1, size, LINES_PER_PAGE):
+            yield ''.join(
+                f'{self.offsets[number]:010d} 00000 n \n'
+                for number in range(start, min(start + LINES_PER_PAGE, size))
+            ).encode('ascii')
+        yield (f'trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\n'
+               f'startxref\n{xref_position}\n%%EOF\n').encode('ascii')
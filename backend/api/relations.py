@@ -0,0 +1,43 @@
+from django.utils.functional import cached_property
+
+from recipes.models import Favorite, ShoppingСart, Subscribe
+
+REQUEST_ATTR = '_user_relations'
+
+
+class UserRelations:
+    """Связи текущего пользователя: подписки, избранное и корзина.
+
+    Каждое множество загружается одним запросом при первом обращении.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def _ids(self, model, user_field, id_field):
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(model.objects.filter(
+            **{user_field: self.user}).values_list(id_field, flat=True))
+
+    @cached_property
+    def subscriptions(self):
+        return self._ids(Subscribe, 'follower', 'following_id')
+
+    @cached_property
+    def favorites(self):
+        return self._ids(Favorite, 'user', 'recipe_id')
+
+    @cached_property
+    def shopping_cart(self):
+        return self._ids(ShoppingСart, 'user', 'recipe_id')
+
+
+def get_relations(request):
+    """Возвращает связи пользователя, закешированные на объекте запроса."""
+    http_request = getattr(request, '_request', request)
+    relations = getattr(http_request, REQUEST_ATTR, None)
+    if relations is None or relations.user != request.user:
+        relations = UserRelations(request.user)
+        setattr(http_request, REQUEST_ATTR, relations)
+    return relations
@@ -0,0 +1,143 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+
+from .authentication import CachedTokenAuthentication
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'replica_pin'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать.
+
+    Django 3.2 проверяет соединение только после ошибки в нем, а
+    CONN_HEALTH_CHECKS появились в 4.1.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+class ReplicaRouter:
+    """Чтение с реплики внутри запросов, отмеченных ReplicaMiddleware."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+@contextmanager
+def using_primary():
+    """Читает с основной базы, например данные для долгоживущего кеша."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin(request, response, user_id):
+    """Отправляет чтение пользователя на основную базу.
+
+    Отметка хранится в подписанной cookie, которую проверит любой
+    процесс, и в кеше для клиентов без cookie: с LocMemCache ее видит
+    только текущий процесс.
+    """
+    response.set_signed_cookie(
+        PIN_COOKIE, str(user_id), salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS, secure=request.is_secure(),
+        httponly=True, samesite='Lax')
+    cache.set(pin_key(user_id), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def pinned(request, user_id):
+    value = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS)
+    return value == str(user_id) or bool(cache.get(pin_key(user_id)))
+
+
+def request_user_id(request):
+    """Пользователь по заголовку Authorization, без DRF и с кешем токенов.
+
+    Возвращает False, если токен передан, но недействителен.
+    """
+    header = get_authorization_header(request).split()
+    if not header or header[0].lower() != b'token':
+        return None
+    try:
+        key = header[1].decode()
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except (IndexError, UnicodeError, exceptions.AuthenticationFailed):
+        return False
+    return user.id
+
+
+class ReplicaMiddleware:
+    """Отправляет чтение безопасных запросов на реплику.
+
+    Используются только действия из replica_actions класса view. Для
+    APIView без действий сравнивается метод в нижнем регистре. После
+    успешного изменяющего запроса пользователь на REPLICA_PIN_SECONDS
+    читает с основной базы и видит свои изменения.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin(request, response, user.id)
+        return response
+
+    def use_replica(self, request, view_func):
+        if request.method not in SAFE_METHODS:
+            return False
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_class, 'replica_actions', ())
+        action = (getattr(view_func, 'actions', None) or {}).get(
+            request.method.lower(), request.method.lower())
+        if action not in actions:
+            return False
+        user_id = request_user_id(request)
+        return user_id is not False and (
+            user_id is None or not pinned(request, user_id))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.use_replica(request, view_func):
+            _read_alias.set(settings.REPLICA_DATABASE)
@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorField)
+from django.db import connections
+from django.db.models import (BooleanField, CharField, Count, Expression, F,
+                              FloatField, Func, Max, Q, Value)
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.response import Response
+
+from recipes.models import Ingredient, IngredientAmount
+
+from .cache import recipe_cache
+from .replicas import using_primary
+
+INGREDIENTS = 'ingredients'
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов в памяти процесса.
+
+    Поиск без учета регистра: сначала совпадения по началу названия,
+    затем вхождения подстроки, ранжированные по позиции вхождения.
+    """
+
+    def __init__(self, rows, generation, state):
+        self.rows = rows
+        self.generation = generation
+        # (число ингредиентов, последняя дата изменения) на момент сборки.
+        self.state = state
+        self.last_modified = state[1]
+        self.checked = time.monotonic()
+        entries = sorted((row['name'].lower(), position)
+                         for position, row in enumerate(rows))
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def search(self, query, limit):
+        query = query.lower()
+        found = []
+        start = bisect_left(self.keys, query)
+        for index in range(start, len(self.keys)):
+            if len(found) >= limit or not self.keys[index].startswith(query):
+                break
+            found.append(self.positions[index])
+        if len(found) < limit:
+            contains = sorted(
+                (key.find(query), key, position)
+                for key, position in zip(self.keys, self.positions)
+                if key.find(query) > 0)
+            found += [position for *_, position
+                      in contains[:limit - len(found)]]
+        return [self.rows[position] for position in found]
+
+    @property
+    def version(self):
+        return self.generation, self.state
+
+
+class IngredientIndexLoader:
+    """Хранит индекс и перестраивает его после изменения ингредиентов.
+
+    Изменения через модели увеличивают версию в кеше, и индекс
+    перестраивается сразу. Если кеш не общий для процессов (LocMemCache)
+    или ингредиенты загружены командой в другом процессе, изменение
+    замечается по числу ингредиентов и последней дате изменения, которые
+    проверяются не чаще раза в INGREDIENT_INDEX_RECHECK секунд.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get_state(self):
+        state = Ingredient.objects.aggregate(
+            total=Count('id'), last_modified=Max('modified'))
+        return state['total'], state['last_modified']
+
+    def build(self, generation):
+        with using_primary():
+            state = self.get_state()
+            rows = list(Ingredient.objects.values(
+                'id', 'name', 'measurement_unit'))
+        return IngredientIndex(rows, generation, state)
+
+    def expired(self, index):
+        return (time.monotonic() - index.checked
+                >= settings.INGREDIENT_INDEX_RECHECK)
+
+    def get(self):
+        generation, = recipe_cache.get_generations((INGREDIENTS,))
+        index = self._index
+        if (index is not None and index.generation == generation
+                and not self.expired(index)):
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or index.generation != generation:
+                index = self._index = self.build(generation)
+            elif self.expired(index):
+                with using_primary():
+                    state = self.get_state()
+                if state != index.state:
+                    index = self._index = self.build(generation)
+                else:
+                    index.checked = time.monotonic()
+        return index
+
+
+ingredient_index = IngredientIndexLoader()
+
+
+class IngredientSearchMixin:
+    """Отдает список ингредиентов и поиск по ?name= из индекса в памяти."""
+
+    def list(self, request, *args, **kwargs):
+        index = ingredient_index.get()
+        name = request.query_params.get('name')
+        if not name:
+            return Response(index.rows)
+        return Response(
+            index.search(name, settings.INGREDIENT_SEARCH_LIMIT))
+
+
+class UserSearchText(Func):
+    """username, имя и фамилия через пробел; то же выражение, что в
+    индексе users_customuser_search_trgm."""
+    template = '(%(expressions)s)'
+    arg_joiner = " || ' ' || "
+    output_field = CharField()
+
+    def __init__(self):
+        super().__init__('username', 'first_name', 'last_name')
+
+
+class WordSimilarity(Func):
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+class WordSimilar(Func):
+    """Оператор pg_trgm "<%": в тексте есть слово, похожее на запрос."""
+    template = '%(expressions)s'
+    arg_joiner = ' <%% '
+    output_field = BooleanField()
+
+
+class ILike(Func):
+    template = '%(expressions)s'
+    arg_joiner = ' ILIKE '
+    output_field = BooleanField()
+
+
+def like_pattern(query):
+    return '%{}%'.format(re.sub(r'([\\%_])', r'\\\1', query))
+
+
+class UserSearchFilter(BaseFilterBackend):
+    """Поиск пользователей по ?search= в username, имени и фамилии.
+
+    На PostgreSQL условия используют GIN-индекс pg_trgm, а результаты
+    сортируются по word_similarity. На других СУБД поиск выполняется
+    через icontains.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(Q(username__icontains=query)
+                                   | Q(first_name__icontains=query)
+                                   | Q(last_name__icontains=query))
+        text = UserSearchText()
+        return queryset.filter(
+            WordSimilar(Value(query), text)
+            | ILike(text, Value(like_pattern(query)))
+        ).annotate(
+            rank=WordSimilarity(Value(query), text)
+        ).order_by('-rank', 'username')
+
+
+class RecipeSearchVector(Expression):
+    """Колонка recipes_recipe.search_vector из миграции 0013.
+
+    Поле не объявлено в модели, поэтому вектор не загружается вместе
+    с рецептами.
+    """
+    output_field = SearchVectorField()
+
+    def as_sql(self, compiler, connection):
+        alias = compiler.query.get_initial_alias()
+        return f'{compiler.quote_name_unless_alias(alias)}.search_vector', []
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск с конфигурацией russian и сортировкой по
+    ts_rank; на других СУБД - icontains по названию, описанию и
+    ингредиентам."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+            | Q(id__in=IngredientAmount.objects.filter(
+                ingredient__name__icontains=query).values('recipe_id')))
+    search_query = SearchQuery(query, config='russian',
+                               search_type='websearch')
+    # ts_rank возвращает real; double precision сравнивается с курсором
+    # keyset-пагинации без потери точности.
+    return queryset.alias(
+        search_vector=RecipeSearchVector()
+    ).filter(
+        search_vector=search_query
+    ).annotate(
+        rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+    ).order_by('-rank', '-id')
@@ -1,3 +1,6 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.expressions import RawSQL
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
@@ -8,6 +11,10 @@ from recipes.constants import MIN_VALUE, MAX_VALUE
 from users.models import CustomUser
 from users.serializers import ProfileSerializer
 
+from . import counters, feed, shopping_list
+from .relations import get_relations
+from .signals import recipe_rewrite
+
 
 class IngredientSerializer(serializers.ModelSerializer):
 
@@ -48,30 +55,26 @@ class RecipeListSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients',
                   'name', 'image', 'text', 'cooking_time',
-                  'is_favorited', 'is_in_shopping_cart')
+                  'is_favorited', 'is_in_shopping_cart', 'favorites_count')
         model = Recipe
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and Favorite.objects.filter(user=request.user,
-                                        recipe=obj).exists()
-        )
+        return bool(request) and obj.id in get_relations(request).favorites
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and ShoppingСart.objects.filter(user=request.user,
-                                            recipe=obj).exists()
-        )
+        return (bool(request)
+                and obj.id in get_relations(request).shopping_cart)
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Ингредиенты проверяются одним запросом в RecipeSerializer.
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(min_value=MIN_VALUE, max_value=MAX_VALUE)
 
     class Meta:
@@ -113,37 +116,80 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return data
 
+    def validate_ingredients(self, ingredients):
+        found = Ingredient.objects.in_bulk(
+            [item['id'] for item in ingredients])
+        if len(found) == len({item['id'] for item in ingredients}):
+            return ingredients
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist']
+        raise serializers.ValidationError([
+            {} if item['id'] in found
+            else {'id': [message.format(pk_value=item['id'])]}
+            for item in ingredients])
+
     def to_representation(self, instance):
         request = self.context.get('request')
+        view = self.context.get('view')
+        if view is not None:
+            instance = view.get_queryset().get(pk=instance.pk)
         serializer = RecipeListSerializer(
             instance,
             context={'request': request})
         return serializer.data
 
-    def tags_and_ingredients_set(self, recipe, tags, ingredients):
-        recipe.tags.set(tags)
-        for ingredient in ingredients:
-            IngredientAmount.objects.bulk_create([
-                IngredientAmount(
-                    recipe=recipe,
-                    ingredient=ingredient.get('id'),
-                    amount=ingredient.get('amount'),)
-            ])
-
+    def set_ingredients(self, recipe, ingredients):
+        """Приводит состав рецепта к новому: одна вставка, одно
+        обновление и одно удаление только для изменившихся строк.
+
+        Возвращает прежние количества ингредиентов.
+        """
+        current = {row.ingredient_id: row
+                   for row in recipe.ingredient_amount.all()}
+        old_amounts = {ingredient_id: row.amount
+                       for ingredient_id, row in current.items()}
+        new_amounts = {item['id']: item['amount'] for item in ingredients}
+        removed = [row.id for ingredient_id, row in current.items()
+                   if ingredient_id not in new_amounts]
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = new_amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        created = [
+            IngredientAmount(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current]
+        with recipe_rewrite(recipe):
+            if removed:
+                IngredientAmount.objects.filter(id__in=removed).delete()
+            if changed:
+                IngredientAmount.objects.bulk_update(changed, ['amount'])
+            if created:
+                IngredientAmount.objects.bulk_create(created)
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
+        ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
-
-        self.tags_and_ingredients_set(recipe, tags, ingredients_data)
+        counters.change_recipes(author.id, 1)
+        recipe.tags.set(tags)
+        self.set_ingredients(recipe, ingredients)
+        feed.publish(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        tags = validated_data.pop('tags')
-        self.tags_and_ingredients_set(instance, tags, ingredients)
+        instance.tags.set(validated_data.pop('tags'))
+        old_amounts, new_amounts = self.set_ingredients(
+            instance, validated_data.pop('ingredients'))
+        if old_amounts != new_amounts:
+            shopping_list.change_recipe(instance.id, old_amounts, new_amounts)
         return super().update(instance, validated_data)
 
 
@@ -154,32 +200,65 @@ class RecipeMiniFieldSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+def get_recipes_limit(request):
+    try:
+        limit = int(request.GET.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
 class SubscribeListSerializer(ProfileSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+
+    RANKED_RECIPES_SQL = (
+        'SELECT ranked.id FROM ('
+        ' SELECT recipe.id, ROW_NUMBER() OVER ('
+        '  PARTITION BY recipe.author_id ORDER BY recipe.name, recipe.id'
+        ' ) AS position'
+        f' FROM {Recipe._meta.db_table} recipe'
+        ' WHERE recipe.author_id IN ({authors})'
+        ') ranked WHERE ranked.position <= %s'
+    )
 
     class Meta(ProfileSerializer.Meta):
         model = CustomUser
-        fields = ProfileSerializer.Meta.fields + ('recipes', 'recipes_count')
+        fields = ProfileSerializer.Meta.fields + (
+            'recipes', 'recipes_count', 'followers_count')
+        read_only_fields = ('recipes_count', 'followers_count')
+
+    @classmethod
+    def prefetch_recipes(cls, authors, request):
+        """Первые recipes_limit рецептов каждого автора страницы.
+
+        Рецепты загружаются одним запросом с ROW_NUMBER() OVER
+        (PARTITION BY author_id) только по авторам страницы.
+        """
+        authors = list(authors)
+        recipes = Recipe.objects.order_by('name', 'id')
+        limit = get_recipes_limit(request)
+        if limit is not None and authors:
+            sql = cls.RANKED_RECIPES_SQL.format(
+                authors=', '.join(['%s'] * len(authors)))
+            recipes = recipes.filter(id__in=RawSQL(
+                sql, (*(author.id for author in authors), limit)))
+        prefetch_related_objects(authors, Prefetch(
+            'resipe', queryset=recipes, to_attr='limited_recipes'))
+        return authors
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj)
-        if limit:
-            try:
-                recipes = recipes[:int(limit)]
-            except ValueError:
-                pass
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = Recipe.objects.filter(author=obj)
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
         return RecipeMiniFieldSerializer(
             recipes,
             many=True,
             context=self.context).data
 
-    def get_recipes_count(self, obj):
-        recipes = Recipe.objects.filter(author=obj)
-        return recipes.count()
-
 
 class SubcribeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -203,8 +282,10 @@ class SubcribeSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        following, = SubscribeListSerializer.prefetch_recipes(
+            CustomUser.objects.filter(pk=instance.following_id), request)
         return SubscribeListSerializer(
-            instance.following, context={'request': request}
+            following, context={'request': request}
         ).data
 
 
@@ -0,0 +1,129 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import IngredientAmount, ShoppingListItem, ShoppingСart
+from users.models import CustomUser
+
+_released = threading.local()
+
+
+def released_recipes():
+    """Рецепты, уже убранные из списков покупок целиком."""
+    if not hasattr(_released, 'ids'):
+        _released.ids = set()
+    return _released.ids
+
+
+def recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте."""
+    return Counter(dict(IngredientAmount.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount')))
+
+
+def cart_user_ids(recipe_id):
+    return list(ShoppingСart.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True))
+
+
+def apply_deltas(user_ids, deltas):
+    """Изменяет списки покупок пользователей на одинаковые разности.
+
+    Строки пользователей блокируются, поэтому параллельные изменения
+    одного списка выполняются по очереди.
+    """
+    deltas = {ingredient_id: delta
+              for ingredient_id, delta in deltas.items() if delta}
+    user_ids = sorted(set(user_ids))
+    if not user_ids or not deltas:
+        return
+    with transaction.atomic():
+        list(CustomUser.objects.select_for_update().filter(
+            id__in=user_ids).order_by('id').values_list('id', flat=True))
+        items = ShoppingListItem.objects.filter(user_id__in=user_ids)
+        existing = set(items.filter(
+            ingredient_id__in=deltas).values_list('user_id', 'ingredient_id'))
+        items.filter(ingredient_id__in=deltas).update(
+            amount=Greatest(F('amount') + Case(
+                *(When(ingredient_id=ingredient_id, then=Value(delta))
+                  for ingredient_id, delta in deltas.items()),
+                output_field=IntegerField()), Value(0)))
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             amount=delta)
+            for ingredient_id, delta in deltas.items() if delta > 0
+            for user_id in user_ids
+            if (user_id, ingredient_id) not in existing
+        ])
+        items.filter(ingredient_id__in=deltas, amount__lte=0).delete()
+
+
+def add_recipe(user_ids, recipe_id):
+    apply_deltas(user_ids, recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_ids, recipe_id):
+    amounts = recipe_amounts(recipe_id)
+    apply_deltas(user_ids, {ingredient_id: -amount
+                            for ingredient_id, amount in amounts.items()})
+
+
+@contextmanager
+def recipe_release(recipe_id):
+    """Убирает рецепт из всех списков одним изменением; строки корзины,
+    удаленные внутри блока, списки больше не меняют."""
+    remove_recipe(cart_user_ids(recipe_id), recipe_id)
+    released_recipes().add(recipe_id)
+    try:
+        yield
+    finally:
+        released_recipes().discard(recipe_id)
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в корзины пользователей."""
+    deltas = Counter(new_amounts)
+    deltas.subtract(old_amounts)
+    apply_deltas(cart_user_ids(recipe_id), deltas)
+
+
+def compute_totals(user_ids):
+    """Суммы ингредиентов, посчитанные заново по корзинам."""
+    rows = ShoppingСart.objects.filter(
+        user_id__in=user_ids,
+        recipe__ingredient_amount__isnull=False,
+    ).values_list(
+        'user_id', 'recipe__ingredient_amount__ingredient_id'
+    ).annotate(
+        total=Sum('recipe__ingredient_amount__amount')
+    ).order_by()
+    return {(user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows}
+
+
+def stored_totals(user_ids):
+    return {(user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.filter(
+                user_id__in=user_ids).values_list(
+                    'user_id', 'ingredient_id', 'amount')}
+
+
+@receiver(post_save, sender=ShoppingСart)
+def cart_saved(sender, instance, created, raw=False, **kwargs):
+    """Строки корзины меняют список покупок при любом способе записи,
+    включая админку и каскадное удаление рецепта или пользователя."""
+    if created and not raw:
+        add_recipe([instance.user_id], instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingСart)
+def cart_deleting(sender, instance, **kwargs):
+    if instance.recipe_id not in released_recipes():
+        remove_recipe([instance.user_id], instance.recipe_id)
@@ -0,0 +1,145 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from users.models import CustomUser
+
+from .authentication import token_cache
+from .cache import (GLOBAL, LISTS, author_generation, recipe_cache,
+                    recipe_generation, tag_generation)
+from .cooking import COOKING
+from .search import INGREDIENTS
+
+IGNORED_USER_FIELDS = frozenset(('last_login', 'password'))
+TOKEN_IGNORED_USER_FIELDS = frozenset(('last_login',))
+
+_muted = threading.local()
+
+
+def muted_recipes():
+    """Рецепты, для которых изменения строк не сбрасывают кеш."""
+    if not hasattr(_muted, 'ids'):
+        _muted.ids = set()
+    return _muted.ids
+
+
+@contextmanager
+def recipe_rewrite(recipe):
+    """Сбрасывает кеш рецепта один раз вместо сброса на каждую строку."""
+    muted = recipe.id not in muted_recipes()
+    muted_recipes().add(recipe.id)
+    try:
+        yield
+    finally:
+        if muted:
+            muted_recipes().discard(recipe.id)
+    invalidate_recipe(recipe)
+
+
+def recipe_generations(recipe_id, author_id, tag_slugs):
+    return (recipe_generation(recipe_id), author_generation(author_id),
+            LISTS, COOKING, *(tag_generation(slug) for slug in tag_slugs))
+
+
+def invalidate_recipe(recipe):
+    slugs = recipe.tags.values_list('slug', flat=True)
+    recipe_cache.invalidate(
+        *recipe_generations(recipe.id, recipe.author_id, slugs))
+
+
+def invalidate_recipe_by_id(recipe_id):
+    if recipe_id in muted_recipes():
+        return
+    recipe = Recipe.objects.filter(id=recipe_id).only('author_id').first()
+    if recipe is not None:
+        invalidate_recipe(recipe)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    invalidate_recipe(instance)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    muted_recipes().add(instance.id)
+    invalidate_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    muted_recipes().discard(instance.id)
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def ingredient_amount_changed(sender, instance, **kwargs):
+    if instance.recipe_id not in muted_recipes():
+        # Дата изменения нужна индексу "что приготовить" для догрузки.
+        Recipe.objects.filter(id=instance.recipe_id).update(
+            modified=timezone.now())
+    invalidate_recipe_by_id(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if reverse:
+        if action.startswith('post_'):
+            recipe_cache.invalidate(GLOBAL)
+        return
+    if action == 'pre_clear':
+        invalidate_recipe(instance)
+    elif action in ('post_add', 'post_remove'):
+        slugs = Tag.objects.filter(id__in=pk_set).values_list(
+            'slug', flat=True)
+        recipe_cache.invalidate(*recipe_generations(
+            instance.id, instance.author_id, slugs))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalogue_changed(sender, **kwargs):
+    recipe_cache.invalidate(GLOBAL)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    recipe_cache.invalidate(INGREDIENTS)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields
+                   and IGNORED_USER_FIELDS.issuperset(update_fields)):
+        return
+    recipe_cache.invalidate(GLOBAL, author_generation(instance.id))
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    recipe_cache.invalidate(GLOBAL, author_generation(instance.id))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate((instance.key,))
+
+
+@receiver(post_save, sender=CustomUser)
+def user_tokens_changed(sender, instance, created, update_fields, **kwargs):
+    """Пароль, активность и данные профиля меняются через save()."""
+    if created or (update_fields
+                   and TOKEN_IGNORED_USER_FIELDS.issuperset(update_fields)):
+        return
+    token_cache.invalidate(Token.objects.filter(
+        user_id=instance.id).values_list('key', flat=True))
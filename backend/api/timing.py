@@ -0,0 +1,223 @@
+import cProfile
+import json
+import logging
+import os
+import random
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter, strftime
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger('api.timing')
+
+_current = ContextVar('request_timings', default=None)
+_query_wrappers = ContextVar('query_wrappers', default=())
+
+
+class RequestTimings:
+    """Время обработки одного запроса по этапам, в миллисекундах."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += (perf_counter() - started) * 1000
+            self.queries += 1
+
+
+@contextmanager
+def install_query_wrappers(wrappers):
+    """Подключает execute_wrapper к соединениям текущего потока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            for wrapper in wrappers:
+                stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """Подключает wrapper к SQL-запросам обработки запроса.
+
+    Обертка запоминается в контекстной переменной: асинхронные view
+    выполняют запросы в потоках пула и подключают ее там заново
+    (request_query_wrappers).
+    """
+    token = _query_wrappers.set((*_query_wrappers.get(), wrapper))
+    try:
+        with install_query_wrappers((wrapper,)):
+            yield
+    finally:
+        _query_wrappers.reset(token)
+
+
+def request_query_wrappers():
+    return _query_wrappers.get()
+
+
+@contextmanager
+def measure_render():
+    """Учитывает время рендеринга ответа без запросов к БД."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    db_before = timings.db
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.render += ((perf_counter() - started) * 1000
+                           - (timings.db - db_before))
+
+
+@contextmanager
+def measure_serialization():
+    """Учитывает время сборки ответа без запросов к БД внутри нее.
+
+    Вложенные вызовы учитываются один раз, во внешнем.
+    """
+    timings = _current.get()
+    if timings is None or timings.depth:
+        yield
+        return
+    timings.depth += 1
+    db_before = timings.db
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.depth -= 1
+        timings.serialize += ((perf_counter() - started) * 1000
+                              - (timings.db - db_before))
+
+
+def install_serializer_timing():
+    """Оборачивает BaseSerializer.data, через который отдают данные
+    все сериализаторы DRF."""
+    data = serializers.BaseSerializer.data
+    if getattr(data.fget, 'timed', False):
+        return
+
+    def timed_data(self):
+        with measure_serialization():
+            return data.fget(self)
+
+    timed_data.timed = True
+    serializers.BaseSerializer.data = property(timed_data)
+
+
+def view_name(request):
+    match = request.resolver_match
+    if match is None:
+        return None
+    callback = match.func
+    view_class = getattr(callback, 'cls', None) or getattr(
+        callback, 'view_class', None)
+    if view_class is None:
+        return match._func_path
+    name = f'{view_class.__module__}.{view_class.__name__}'
+    action = (getattr(callback, 'actions', None) or {}).get(
+        request.method.lower())
+    return f'{name}.{action}' if action else name
+
+
+class ServerTimingMiddleware:
+    """Замеряет SQL, сериализацию и рендеринг ответа.
+
+    Результат отдается в заголовке Server-Timing и пишется в лог
+    api.timing одной JSON-строкой. Часть запросов (SERVER_TIMING_PROFILE_RATE)
+    выполняется под cProfile; профиль сохраняется, если запрос оказался
+    медленнее SERVER_TIMING_PROFILE_THRESHOLD миллисекунд. Выключенный
+    SERVER_TIMING убирает middleware из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.profile_rate = settings.SERVER_TIMING_PROFILE_RATE
+        self.profile_threshold = settings.SERVER_TIMING_PROFILE_THRESHOLD
+        self.profile_dir = settings.SERVER_TIMING_PROFILE_DIR
+        install_serializer_timing()
+
+    def start_profile(self):
+        if not self.profile_rate or random.random() >= self.profile_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None
+        return profile
+
+    def save_profile(self, profile, name, total):
+        profile.disable()
+        if total < self.profile_threshold:
+            return None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(
+            self.profile_dir,
+            f'{strftime("%Y%m%d-%H%M%S")}-{name or "unknown"}-'
+            f'{total:.0f}ms-{uuid4().hex[:8]}.prof')
+        profile.dump_stats(path)
+        return path
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profile = self.start_profile()
+        started = perf_counter()
+        try:
+            with wrap_queries(timings.execute):
+                response = self.get_response(request)
+        finally:
+            total = (perf_counter() - started) * 1000
+            _current.reset(token)
+        name = view_name(request)
+        profile_path = (self.save_profile(profile, name, total)
+                        if profile is not None else None)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timings.db:.1f};desc="{timings.queries} queries"',
+            f'serialize;dur={timings.serialize:.1f}',
+            f'render;dur={timings.render:.1f}',
+            f'total;dur={total:.1f}',
+        ))
+        logger.info(json.dumps({
+            'view': name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total, 1),
+            'db_ms': round(timings.db, 1),
+            'queries': timings.queries,
+            'serialize_ms': round(timings.serialize, 1),
+            'render_ms': round(timings.render, 1),
+            'profile': profile_path,
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        if _current.get() is None:
+            return response
+        render = response.render
+
+        def timed_render():
+            with measure_render():
+                return render()
+
+        response.render = timed_render
+        return response
@@ -1,10 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
 from users.views import UserViewSet
-from .views import (APIFavorite, APIShoppingCart, IngredientViewSet,
-                    RecipeViewSet, SubscribeListView, SubscribeViewSet,
-                    TagViewSet)
+from .async_views import async_patterns
+from .views import (APIDownloadShoppingCart, APIFavorite, APIShoppingCart,
+                    IngredientViewSet, RecipeViewSet, SubscribeListView,
+                    SubscribeViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -21,6 +23,10 @@ urlpatterns = [
     path('users/<int:id>/subscribe/', SubscribeViewSet.as_view()),
     path('recipes/<int:id>/favorite/', APIFavorite.as_view()),
     path('recipes/<int:id>/shopping_cart/', APIShoppingCart.as_view()),
-    path('recipes/download_shopping_cart/', APIShoppingCart.as_view()),
+    path('recipes/download_shopping_cart/',
+         APIDownloadShoppingCart.as_view()),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_VIEWS:
+    async_patterns(urlpatterns)
@@ -1,19 +1,32 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, Max, OuterRef,
+                              Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingСart, Subscribe, Tag)
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingСart,
+                            Subscribe, Tag)
 from users.models import CustomUser
+
+from . import counters, feed, shopping_list
+from .cache import RecipeCacheMixin
+from .conditional import ConditionalGetMixin
+from .cooking import WhatCanICookMixin
+from .feed import FeedMixin
+from .exports import EXPORT_FORMATS, shopping_list_rows
 from .filters import IngredientSearchFilter, RecipeFilter
+from .negotiation import FirstRendererNegotiation
 from .permissions import IsAuthorOrReadOnlyPermission
+from .readers import FastListMixin
+from .search import IngredientSearchMixin, ingredient_index
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           RecipeListSerializer, RecipeSerializer,
                           ShoppingCartSerializer, SubcribeSerializer,
@@ -21,30 +34,92 @@ from .serializers import (FavoriteSerializer, IngredientSerializer,
 from .pagination import CustomPaginator
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, IngredientSearchMixin,
+                        ReadOnlyModelViewSet):
     """Вьюсеты для модели Ingredient."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
     filterset_class = IngredientSearchFilter
+    replica_actions = ('list', 'retrieve')
+    async_actions = ('list', 'retrieve')
+
+    def get_list_validator(self, request):
+        index = ingredient_index.get()
+        return ((index.version, request.query_params.urlencode()),
+                index.last_modified)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     """Вьюсеты для модели Tag."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    replica_actions = ('list', 'retrieve')
+    async_actions = ('list', 'retrieve')
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, RecipeCacheMixin, FastListMixin,
+                    WhatCanICookMixin, FeedMixin, ModelViewSet):
     """Вьюсеты для модели Recipe."""
-    queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnlyPermission,)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('name', 'favorites_count')
     pagination_class = CustomPaginator
+    conditional_actions = ('retrieve',)
+    replica_actions = ('list', 'retrieve', 'what_can_i_cook', 'feed')
+    async_actions = ('list', 'retrieve', 'what_can_i_cook', 'feed')
+
+    def annotate_flags(self, queryset):
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingСart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))))
+        return queryset.annotate(
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField()))
+
+    def get_queryset(self):
+        return self.annotate_flags(
+            Recipe.objects.select_related('author').prefetch_related(
+                'tags', 'ingredient_amount__ingredient'))
+
+    def get_detail_validator(self, request, pk):
+        queryset = self.annotate_flags(Recipe.objects.filter(pk=pk))
+        user = request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscribe.objects.filter(follower=user,
+                                         following=OuterRef('author'))))
+        else:
+            queryset = queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField()))
+        state = queryset.annotate(
+            tags_modified=Max('tags__modified'),
+            ingredients_modified=Max('ingredients__modified'),
+            tags_count=Count('tags', distinct=True),
+            ingredients_count=Count('ingredient_amount', distinct=True),
+        ).values_list(
+            'modified', 'tags_modified', 'ingredients_modified',
+            'tags_count', 'ingredients_count', 'favorites_count',
+            'is_favorited', 'is_in_shopping_cart', 'is_subscribed', 'author__email',
+            'author__username', 'author__first_name', 'author__last_name',
+        ).first()
+        if state is None:
+            return None
+        return (pk, *state), None
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        counters.change_recipes(instance.author_id, -1)
+        with shopping_list.recipe_release(instance.id):
+            instance.delete()
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -57,15 +132,22 @@ class SubscribeListView(ListAPIView):
     serializer_class = SubscribeListSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = CustomPaginator
+    replica_actions = ('get',)
+    async_actions = ('get',)
 
     def get_queryset(self):
         return CustomUser.objects.filter(following__follower=self.request.user)
 
+    def paginate_queryset(self, queryset):
+        return SubscribeListSerializer.prefetch_recipes(
+            super().paginate_queryset(queryset), self.request)
+
 
 class SubscribeViewSet(APIView):
     """Создает подписку/отписку на/от автора."""
     permission_classes = (IsAuthenticated,)
 
+    @transaction.atomic
     def post(self, request, **kwargs):
         following = get_object_or_404(CustomUser, id=kwargs['id'])
         serializer = SubcribeSerializer(
@@ -74,8 +156,11 @@ class SubscribeViewSet(APIView):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        counters.change_followers(following.id, 1)
+        feed.follow(request.user.id, following.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, **kwargs):
         following = get_object_or_404(CustomUser, id=kwargs['id'])
         count_delete, _ = Subscribe.objects.filter(follower=request.user,
@@ -86,6 +171,8 @@ class SubscribeViewSet(APIView):
                 {'errors': 'Вы не подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        counters.change_followers(following.id, -1)
+        feed.unfollow(request.user.id, following.id)
         return Response({'status': 'Успешная отписка'},
                         status=status.HTTP_204_NO_CONTENT)
 
@@ -94,6 +181,7 @@ class APIFavorite(APIView):
     """Добавляет/удаляет рецепт в/из избранного."""
     permission_classes = (IsAuthenticated,)
 
+    @transaction.atomic
     def post(self, request, **kwargs):
         serializer = FavoriteSerializer(
             data={'user': request.user.id, 'recipe': kwargs['id']},
@@ -101,8 +189,10 @@ class APIFavorite(APIView):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        counters.change_favorites(kwargs['id'], 1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, **kwargs):
         recipe = get_object_or_404(Recipe, id=kwargs['id'])
         count_delete, _ = Favorite.objects.filter(user=request.user,
@@ -110,6 +200,7 @@ class APIFavorite(APIView):
         if not count_delete:
             return Response({'error': 'Рецепта нет в избранном'},
                             status=status.HTTP_400_BAD_REQUEST)
+        counters.change_favorites(recipe.id, -1)
         return Response({'detail': 'Рецепт удален из избранного'},
                         status=status.HTTP_204_NO_CONTENT)
 
@@ -118,6 +209,7 @@ class APIShoppingCart(APIView):
     """Добавляет/удаляет рецепт в/из корзину."""
     permission_classes = (IsAuthenticated,)
 
+    @transaction.atomic
     def post(self, request, **kwargs):
         serializer = ShoppingCartSerializer(
             data={'user': request.user.id, 'recipe': kwargs['id']},
@@ -127,6 +219,7 @@ class APIShoppingCart(APIView):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, **kwargs):
         recipe = get_object_or_404(Recipe, id=kwargs['id'])
         count_delete, _ = ShoppingСart.objects.filter(
@@ -138,21 +231,23 @@ class APIShoppingCart(APIView):
         return Response({'detail': 'Рецепт удален из избранного'},
                         status=status.HTTP_204_NO_CONTENT)
 
+
+class APIDownloadShoppingCart(APIView):
+    """Скачивание списка покупок в формате txt, csv, json или pdf."""
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = FirstRendererNegotiation
+
     def get(self, request):
-        recipe = ShoppingСart.objects.filter(user=request.user
-                                             ).values_list('recipe_id')
-
-        ingredients = IngredientAmount.objects.filter(
-            recipe__in=recipe).values(
-                'ingredient__name',
-                'ingredient__measurement_unit').annotate(amount=Sum('amount'))
-        shopping_list = ['Список покупок:']
-        for ingredient in ingredients:
-            name = ingredient["ingredient__name"]
-            amount = ingredient["amount"]
-            measurement_unit = ingredient["ingredient__measurement_unit"]
-            shopping_list.append(f'\n{name} - {amount}, {measurement_unit}')
-        response = FileResponse(shopping_list, content_type='text/plain')
-        response['Content_Disposition'] = ('attachment; '
-                                           'filename="shopping_cart.txt"')
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                           + ', '.join(EXPORT_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST)
+        content_type, render = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            render(shopping_list_rows(request.user)),
+            content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{export_format}"')
         return response
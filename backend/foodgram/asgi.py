@@ -1,7 +1,11 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from api.async_views import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
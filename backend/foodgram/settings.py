@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.timing.ServerTimingMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -63,21 +66,103 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'postgres'),
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+if os.getenv('REPLICA_DB_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('REPLICA_DB_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('REPLICA_DB_HOST'),
+        'PORT': os.getenv('REPLICA_DB_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ('api.replicas.ReplicaRouter',)
+REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else ''
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASYNC_THREADS = int(os.getenv('ASYNC_THREADS', 16))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Кеш ответов для анонимных запросов работает только с кешем, общим для
+# процессов (например, CACHE_BACKEND=...memcached.PyMemcacheCache);
+# с LocMemCache он отключен.
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 300))
+
+# Общий кеш токенов используется, только если он виден всем процессам:
+# с LocMemCache сброшенный токен жил бы в других процессах до
+# TOKEN_CACHE_TIMEOUT секунд.
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS', 'default')
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 300))
+TOKEN_CACHE_LOCAL_TIMEOUT = int(os.getenv('TOKEN_CACHE_LOCAL_TIMEOUT', 10))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+FAST_RECIPE_LIST = os.getenv('FAST_RECIPE_LIST', 'True') == 'True'
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Как часто индекс ингредиентов сверяется с базой, если версия в кеше
+# не изменилась (например, при загрузке ингредиентов командой).
+INGREDIENT_INDEX_RECHECK = int(os.getenv('INGREDIENT_INDEX_RECHECK', 5))
+
+COOKING_LIMIT = int(os.getenv('COOKING_LIMIT', 50))
+# Как часто индекс what_can_i_cook догружает изменения рецептов, если
+# версия в кеше не изменилась (например, после импорта командой).
+COOKING_INDEX_RECHECK = int(os.getenv('COOKING_INDEX_RECHECK', 5))
+
+# Рецепты авторов с большим числом подписчиков не раскладываются по
+# лентам, а читаются при запросе ленты.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', 1000))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False') == 'True'
+SERVER_TIMING_PROFILE_RATE = float(os.getenv('SERVER_TIMING_PROFILE_RATE', 0))
+SERVER_TIMING_PROFILE_THRESHOLD = int(
+    os.getenv('SERVER_TIMING_PROFILE_THRESHOLD', 500))
+SERVER_TIMING_PROFILE_DIR = os.getenv(
+    'SERVER_TIMING_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+METRICS = os.getenv('METRICS', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': (
         'rest_framework.pagination.PageNumberPagination'
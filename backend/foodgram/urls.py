@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics_view
+
 app_name = 'foodgram'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('api/', include('users.urls'))
+    path('api/', include('users.urls')),
+    path('metrics', metrics_view),
 ]
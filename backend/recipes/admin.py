@@ -18,7 +18,8 @@ class IngredientAmountInline(admin.TabularInline):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorites_count')
+    readonly_fields = ('created', 'favorites_count', 'fanned_out')
     inlines = [IngredientAmountInline, ]
 
 
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:54
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count(model, field, outer='pk'):
+    return Coalesce(models.Subquery(
+        model.objects.filter(**{field: models.OuterRef(outer)}).order_by(
+        ).values(field).annotate(total=models.Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Subscribe = apps.get_model('recipes', 'Subscribe')
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Recipe.objects.update(favorites_count=count(Favorite, 'recipe'))
+    CustomUser.objects.update(
+        recipes_count=count(Recipe, 'author'),
+        followers_count=count(Subscribe, 'following'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_auto_20261018_1951'),
+        ('users', '0003_auto_20261018_1954'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', 'id'], name='recipe_favorites_id_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
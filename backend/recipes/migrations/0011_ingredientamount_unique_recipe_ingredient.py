@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Складывает повторы ингредиента в рецепте в одну строку."""
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    duplicates = IngredientAmount.objects.values(
+        'recipe_id', 'ingredient_id'
+    ).annotate(
+        total=models.Sum('amount'), first_id=models.Min('id'),
+        rows=models.Count('id')
+    ).filter(rows__gt=1).order_by()
+    for duplicate in duplicates:
+        rows = IngredientAmount.objects.filter(
+            recipe_id=duplicate['recipe_id'],
+            ingredient_id=duplicate['ingredient_id'])
+        rows.exclude(id=duplicate['first_id']).delete()
+        rows.update(amount=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_auto_20261018_1954'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredientamount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:59
+
+from django.db import migrations, models
+
+
+def move_rows(model, owner, keep_id, duplicate_id):
+    """Переносит строки на оставшийся ингредиент, складывая количества."""
+    for row in model.objects.filter(ingredient_id=duplicate_id):
+        kept = model.objects.filter(
+            ingredient_id=keep_id, **{owner: getattr(row, owner)}).first()
+        if kept is None:
+            row.ingredient_id = keep_id
+            row.save(update_fields=['ingredient'])
+        else:
+            kept.amount += row.amount
+            kept.save(update_fields=['amount'])
+            row.delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=models.Min('id'), rows=models.Count('id')
+    ).filter(rows__gt=1).order_by()
+    for duplicate in duplicates:
+        others = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep_id'])
+        for duplicate_id in others.values_list('id', flat=True):
+            move_rows(IngredientAmount, 'recipe_id', duplicate['keep_id'],
+                      duplicate_id)
+            move_rows(ShoppingListItem, 'user_id', duplicate['keep_id'],
+                      duplicate_id)
+        others.delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Удаления оставляют отложенные проверки внешних ключей, и
+        # PostgreSQL не даст изменить таблицу в той же транзакции.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredientamount_unique_recipe_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_measurement_unit'),
+        ),
+    ]
@@ -0,0 +1,123 @@
+from django.db import migrations
+
+# Колонка search_vector не объявлена в модели, чтобы tsvector не попадал
+# в каждый SELECT рецептов; ее поддерживают триггеры ниже.
+FORWARD = r"""
+ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector;
+
+CREATE FUNCTION recipes_search_vector(bigint, text, text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('russian', $2), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientamount amount
+            JOIN recipes_ingredient ingredient
+                ON ingredient.id = amount.ingredient_id
+            WHERE amount.recipe_id = $1), '')), 'B')
+        || setweight(to_tsvector('russian', $3), 'C')
+$$;
+
+CREATE FUNCTION recipes_recipe_search() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipes_search_vector(NEW.id, NEW.name, NEW.text);
+    RETURN NEW;
+END $$;
+
+CREATE TRIGGER recipes_recipe_search
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search();
+
+CREATE FUNCTION recipes_amount_search() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE recipes_recipe recipe SET search_vector =
+            recipes_search_vector(recipe.id, recipe.name, recipe.text)
+        WHERE recipe.id IN (SELECT recipe_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE recipes_recipe recipe SET search_vector =
+            recipes_search_vector(recipe.id, recipe.name, recipe.text)
+        WHERE recipe.id IN (SELECT recipe_id FROM old_rows);
+    ELSE
+        UPDATE recipes_recipe recipe SET search_vector =
+            recipes_search_vector(recipe.id, recipe.name, recipe.text)
+        WHERE recipe.id IN (
+            SELECT recipe_id FROM new_rows
+            UNION SELECT recipe_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER recipes_amount_search_insert
+AFTER INSERT ON recipes_ingredientamount
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipes_amount_search();
+
+CREATE TRIGGER recipes_amount_search_update
+AFTER UPDATE ON recipes_ingredientamount
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipes_amount_search();
+
+CREATE TRIGGER recipes_amount_search_delete
+AFTER DELETE ON recipes_ingredientamount
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipes_amount_search();
+
+CREATE FUNCTION recipes_ingredient_search() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe recipe SET search_vector =
+        recipes_search_vector(recipe.id, recipe.name, recipe.text)
+    WHERE recipe.id IN (
+        SELECT recipe_id FROM recipes_ingredientamount
+        WHERE ingredient_id = NEW.id);
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER recipes_ingredient_search
+AFTER UPDATE OF name ON recipes_ingredient
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION recipes_ingredient_search();
+
+UPDATE recipes_recipe
+SET search_vector = recipes_search_vector(id, name, text);
+
+CREATE INDEX recipes_recipe_search_vector
+ON recipes_recipe USING gin (search_vector);
+"""
+
+BACKWARD = """
+DROP TRIGGER recipes_ingredient_search ON recipes_ingredient;
+DROP TRIGGER recipes_amount_search_insert ON recipes_ingredientamount;
+DROP TRIGGER recipes_amount_search_update ON recipes_ingredientamount;
+DROP TRIGGER recipes_amount_search_delete ON recipes_ingredientamount;
+DROP TRIGGER recipes_recipe_search ON recipes_recipe;
+DROP FUNCTION recipes_ingredient_search();
+DROP FUNCTION recipes_amount_search();
+DROP FUNCTION recipes_recipe_search();
+DROP FUNCTION recipes_search_vector(bigint, text, text);
+ALTER TABLE recipes_recipe DROP COLUMN search_vector;
+"""
+
+
+def create_search_vector(apps, schema_editor):
+    """Только для PostgreSQL; на других СУБД поиск идет без индекса."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(FORWARD)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_ingredient_unique_ingredient_measurement_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 22:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_created_feedentry'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientamount',
+            options={'ordering': ('id',)},
+        ),
+    ]
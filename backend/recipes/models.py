@@ -1,10 +1,12 @@
 from colorfield.fields import ColorField
-from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
-from .constants import MAX_LENGHT, MIN_VALUE, MAX_VALUE
 from users.models import CustomUser
 
+from .constants import MAX_LENGHT, MAX_VALUE, MIN_VALUE
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -13,11 +15,21 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField(
         max_length=MAX_LENGHT,
         verbose_name='Единицы измерения')
+    modified = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения')
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_measurement_unit'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -33,6 +45,10 @@ class Tag(models.Model):
     slug = models.SlugField(
         max_length=MAX_LENGHT,
         unique=True,)
+    modified = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения')
 
     class Meta:
         ordering = ('name',)
@@ -82,11 +98,30 @@ class Recipe(models.Model):
                 f'Время приготовления не может быть больше {MAX_VALUE} минут')
         ]
     )
+    created = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата создания')
+    modified = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном')
+    fanned_out = models.BooleanField(
+        default=False,
+        verbose_name='Разослан в ленты подписчиков')
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['name', 'id'], name='recipe_name_id_idx'),
+            models.Index(fields=['-favorites_count', 'id'],
+                         name='recipe_favorites_id_idx'),
+            models.Index(fields=['author', '-created', '-id'],
+                         name='recipe_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -119,6 +154,17 @@ class IngredientAmount(models.Model):
         ]
     )
 
+    class Meta:
+        # Порядок ингредиентов в ответах: как в чтении строк, так и в
+        # prefetch сериализаторов.
+        ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            ),
+        ]
+
     def __str__(self):
         return f'{self.ingredient} - {self.amount}'
 
@@ -153,6 +199,46 @@ class Subscribe(models.Model):
         return f'{self.follower} подписан на {self.following}'
 
 
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, записывается при публикации рецепта."""
+    follower = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик')
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор')
+    created = models.DateTimeField(
+        verbose_name='Дата создания рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'recipe'],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['follower', '-created', '-recipe'],
+                         name='feed_follower_created_idx'),
+            models.Index(fields=['follower', 'author'],
+                         name='feed_follower_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.follower}'
+
+
 class BaseModel(models.Model):
     user = models.ForeignKey(
         CustomUser,
@@ -188,3 +274,32 @@ class ShoppingСart(BaseModel):
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в список покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя."""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество ингредиента')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
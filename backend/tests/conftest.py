@@ -0,0 +1,89 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingСart, Tag)
+from users.models import CustomUser
+
+IMAGE = 'recipes/images/test.png'
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Кеш ответов и версии индексов не должны переходить между тестами."""
+    for cache in caches.all():
+        cache.clear()
+    token_cache.local.clear()
+    yield
+
+
+def make_user(name):
+    return CustomUser.objects.create(
+        username=name, email=f'{name}@example.com',
+        first_name=f'{name}-first', last_name=f'{name}-last')
+
+
+@pytest.fixture
+def user(db):
+    return make_user('reader')
+
+
+@pytest.fixture
+def author(db):
+    return make_user('author')
+
+
+@pytest.fixture
+def user_client(user):
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def anon_client():
+    return APIClient()
+
+
+@pytest.fixture
+def tags(db):
+    return [Tag.objects.create(name=f'Тег {index}', slug=f'tag-{index}',
+                               color=f'#00000{index}')
+            for index in range(3)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(5)]
+
+
+@pytest.fixture
+def recipes(author, tags, ingredients, user):
+    """60 рецептов с тегами и ингредиентами; часть в избранном и корзине
+    пользователя."""
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {index:02}', text='Описание',
+               image=IMAGE, cooking_time=10 + index)
+        for index in range(60))
+    recipes = list(Recipe.objects.order_by('id'))
+    CustomUser.objects.filter(id=author.id).update(recipes_count=len(recipes))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for index, recipe in enumerate(recipes)
+        for tag in tags[:index % 3 + 1])
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient,
+                         amount=index + 1)
+        for index, recipe in enumerate(recipes)
+        for ingredient in ingredients[:index % 5 + 1])
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::4])
+    ShoppingСart.objects.bulk_create(
+        ShoppingСart(user=user, recipe=recipe) for recipe in recipes[::5])
+    return recipes
@@ -0,0 +1,99 @@
+import re
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.async_views import StreamingASGIHandler, async_view
+from api.metrics import MetricsMiddleware, get_metrics
+from api.timing import ServerTimingMiddleware
+from api.views import TagViewSet
+from recipes.models import ShoppingListItem
+
+
+def observed_queries():
+    """Сумма и число наблюдений гистограммы запросов без имени view."""
+    samples = {sample.name: sample.value
+               for metric in get_metrics()['queries'].collect()
+               for sample in metric.samples
+               if sample.labels.get('view') == 'unknown'}
+    return (samples.get('http_request_db_queries_sum', 0),
+            samples.get('http_request_db_queries_count', 0))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_pool_queries_are_instrumented(settings, monkeypatch, tags):
+    """Запросы view в потоке пула видны Server-Timing и метрикам."""
+    render = JSONRenderer.render
+
+    def slow_render(self, *args, **kwargs):
+        # Рендеринг трех тегов быстрее точности заголовка (0.1 мс).
+        time.sleep(0.002)
+        return render(self, *args, **kwargs)
+
+    monkeypatch.setattr(JSONRenderer, 'render', slow_render)
+    settings.SERVER_TIMING = True
+    settings.METRICS = True
+    view = async_view(TagViewSet.as_view({'get': 'list'}))
+    middleware = ServerTimingMiddleware(
+        MetricsMiddleware(async_to_sync(view)))
+    before = observed_queries()
+    response = middleware(RequestFactory().get('/api/tags/'))
+    assert response.status_code == 200
+    timing = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+    queries = int(re.search(r'"(\d+) queries"',
+                            response['Server-Timing']).group(1))
+    assert queries > 0
+    assert float(timing['render']) >= 2
+    after = observed_queries()
+    assert after[0] - before[0] == queries
+    assert after[1] - before[1] == 1
+
+
+def asgi_get(handler, path, query_string, headers):
+    """Ответ ASGI-приложения: статус и тело."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(handler)({
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+        'query_string': query_string, 'headers': headers,
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 1024),
+    }, receive, send)
+    status = messages[0]['status']
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    assert messages[-1].get('more_body', False) is False
+    return status, body
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('export_format', ('txt', 'csv', 'json', 'pdf'))
+def test_download_through_asgi(export_format, user, ingredients):
+    """Список покупок читается курсором вне цикла событий целиком."""
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user=user, ingredient=ingredient, amount=100)
+        for ingredient in ingredients)
+    token = Token.objects.create(user=user)
+    client = APIClient()
+    client.force_authenticate(user)
+    expected = b''.join(client.get(
+        '/api/recipes/download_shopping_cart/',
+        {'format': export_format}).streaming_content)
+    assert len(expected) > 100
+    status, body = asgi_get(
+        StreamingASGIHandler(), '/api/recipes/download_shopping_cart/',
+        f'format={export_format}'.encode(),
+        [(b'host', b'testserver'),
+         (b'authorization', f'Token {token.key}'.encode())])
+    assert status == 200
+    assert body == expected
@@ -0,0 +1,26 @@
+import pytest
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+
+
+@pytest.mark.django_db
+@override_settings(TOKEN_CACHE_LOCAL_TIMEOUT=0)
+def test_token_deleted_elsewhere_is_rejected(user, user_client):
+    assert user_client.get('/api/users/me/').status_code == 200
+    # Удаление без сигналов, как в другом процессе: кеш этого процесса
+    # о нем не знает.
+    tokens = Token.objects.filter(user=user)
+    tokens._raw_delete(tokens.db)
+    assert user_client.get('/api/users/me/').status_code == 401
+
+
+def test_shared_tier_needs_cross_process_cache(settings, tmp_path):
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    assert token_cache.shared is None
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(tmp_path)}}
+    assert token_cache.shared is not None
@@ -0,0 +1,10 @@
+import pytest
+from django.core.management import call_command
+
+
+@pytest.mark.django_db
+def test_endpoint_queries_within_baseline(tmp_path):
+    """Число запросов не растет с размером страницы и не превышает базовую
+    линию; при регрессии команда завершается с CommandError."""
+    call_command('benchmark_endpoints', datasets=['small'], repeat=1,
+                 output=str(tmp_path / 'report.json'))
@@ -0,0 +1,17 @@
+import pytest
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', (
+    '/api/recipes/abc/', '/api/tags/abc/', '/api/ingredients/abc/'))
+def test_non_numeric_pk_is_not_found(path, anon_client):
+    assert anon_client.get(path).status_code == 404
+
+
+@pytest.mark.django_db
+def test_recipe_detail_not_modified(recipes, anon_client):
+    path = f'/api/recipes/{recipes[0].id}/'
+    etag = anon_client.get(path)['ETag']
+    response = anon_client.get(path, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
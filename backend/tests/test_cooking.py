@@ -0,0 +1,133 @@
+import json
+import threading
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from api import cooking
+from api.cache import recipe_cache
+from api.cooking import ABSENT, COOKING, CookingIndex, CookingIndexLoader
+from recipes.models import IngredientAmount, Recipe
+
+
+def make_index(version, postings):
+    index = CookingIndex(version)
+    for ingredient_id, recipe_ids in postings.items():
+        for recipe_id in recipe_ids:
+            index.add_recipe(recipe_id)
+    for ingredient_id, recipe_ids in postings.items():
+        for recipe_id in recipe_ids:
+            index.postings[ingredient_id].append(recipe_id)
+            index.sizes[recipe_id] += 1
+    return index
+
+
+def test_clone_does_not_change_served_index():
+    index = make_index(1, {1: [1, 2], 2: [2, 3]})
+    clone = index.clone()
+    clone.remove_recipe(2)
+    assert list(index.postings[1]) == [1, 2]
+    assert list(index.postings[2]) == [2, 3]
+    assert index.sizes[2] == 2
+    assert list(clone.postings[1]) == [1]
+    assert clone.match([2], 10) == [(3, 1.0, 0)]
+
+
+def test_match_is_not_blocked_by_refresh(monkeypatch):
+    version, = recipe_cache.get_generations((COOKING,))
+    loader = CookingIndexLoader()
+    loader._index = make_index(version, {7: [1]})
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_sync(index, version):
+        started.set()
+        assert release.wait(5)
+        index.version = version
+        return True
+
+    monkeypatch.setattr(CookingIndex, 'sync', slow_sync)
+    recipe_cache.bump((COOKING,))
+    thread = threading.Thread(target=loader.refresh)
+    thread.start()
+    try:
+        assert started.wait(5)
+        # Пока копия синхронизируется, запросы отвечают по старому индексу.
+        assert loader.match([7], 10) == [(1, 1.0, 0)]
+    finally:
+        release.set()
+        thread.join()
+    assert loader._index.version != version
+
+
+@pytest.mark.django_db
+def test_imported_recipes_can_be_cooked(tmp_path, monkeypatch, anon_client):
+    monkeypatch.setattr(cooking, 'cooking_index', CookingIndexLoader())
+    # Индекс построен до импорта и должен узнать о нем по версии.
+    assert anon_client.get('/api/recipes/what_can_i_cook/',
+                           {'ingredients': 1}).data == []
+    ingredient = {'name': 'Мука', 'measurement_unit': 'г', 'amount': 200}
+    recipe = {
+        'name': 'Блины', 'text': 'Описание', 'cooking_time': 20,
+        'image': 'recipes/images/test.png', 'tags': [],
+        'ingredients': [ingredient],
+        'author': {'email': 'cook@example.com', 'username': 'cook',
+                   'first_name': 'Повар', 'last_name': 'Поваров'},
+    }
+    path = tmp_path / 'recipes.ndjson'
+    path.write_text(json.dumps(recipe, ensure_ascii=False) + '\n',
+                    encoding='utf-8')
+    call_command('import_recipes', str(path))
+    ingredient_id = IngredientAmount.objects.get().ingredient_id
+    response = anon_client.get('/api/recipes/what_can_i_cook/',
+                               {'ingredients': ingredient_id})
+    assert response.status_code == 200
+    assert [item['name'] for item in response.data] == ['Блины']
+
+
+@pytest.mark.django_db
+def test_sync_finds_deleted_recipe_when_count_is_unchanged(
+        recipes, author, ingredients):
+    index = CookingIndex(1)
+    index.build()
+    deleted_id = recipes[3].id
+    recipes[3].delete()
+    # Рецепт из долгой транзакции импорта: дата изменения раньше окна.
+    created = Recipe.objects.create(
+        author=author, name='Блины', text='Описание',
+        image='recipes/images/test.png', cooking_time=5)
+    IngredientAmount.objects.create(recipe=created,
+                                    ingredient=ingredients[4], amount=1)
+    Recipe.objects.filter(id=created.id).update(
+        modified=timezone.now() - timedelta(hours=1))
+    assert Recipe.objects.count() == index.count
+    assert index.sync(2)
+    assert index.sizes[deleted_id] == ABSENT
+    assert all(deleted_id not in posting
+               for posting in index.postings.values())
+    ids = [match[0] for match in index.match([ingredients[4].id], 100)]
+    assert created.id in ids
+    assert index.count == Recipe.objects.count()
+
+
+@pytest.mark.django_db
+def test_missing_is_counted_by_index(monkeypatch, settings, recipes,
+                                     ingredients, anon_client):
+    settings.COOKING_INDEX_RECHECK = 3600
+    monkeypatch.setattr(cooking, 'cooking_index', CookingIndexLoader())
+    params = {'ingredients': [ingredient.id for ingredient in ingredients],
+              'limit': 50}
+    assert anon_client.get('/api/recipes/what_can_i_cook/', params).data
+    # Строки рецепта изменились в обход сигналов: индекс их опережает.
+    recipe = recipes[4]
+    rows = IngredientAmount.objects.filter(
+        recipe=recipe, ingredient__in=ingredients[2:])
+    rows._raw_delete(connection.alias)
+    response = anon_client.get('/api/recipes/what_can_i_cook/', params)
+    assert response.status_code == 200
+    assert all(item['missing'] >= 0 for item in response.data)
+    item = next(item for item in response.data if item['id'] == recipe.id)
+    assert item['missing'] == 0
@@ -0,0 +1,62 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import counters
+from recipes.models import Favorite, Recipe, Subscribe
+from users.models import CustomUser
+
+
+def favorites_counts(recipes):
+    return dict(Recipe.objects.filter(
+        id__in=[recipe.id for recipe in recipes]
+    ).values_list('id', 'favorites_count'))
+
+
+def user_counts(user):
+    return CustomUser.objects.values_list(
+        'recipes_count', 'followers_count').get(id=user.id)
+
+
+@pytest.mark.django_db
+def test_change_counters(recipes, author):
+    recipe = recipes[0]
+    counters.change_favorites(recipe.id, 2)
+    counters.change_favorites(recipe.id, -1)
+    counters.change_recipes(author.id, -1)
+    counters.change_followers(author.id, 3)
+    assert favorites_counts([recipe]) == {recipe.id: 1}
+    assert user_counts(author) == (59, 3)
+
+
+@pytest.mark.django_db
+def test_user_delete_releases_counters(recipes, author, user):
+    call_command('reconcile_counters')
+    Subscribe.objects.create(follower=user, following=author)
+    counters.change_followers(author.id, 1)
+    favorited = [favorite.recipe for favorite in
+                 Favorite.objects.filter(user=user).select_related('recipe')]
+    before = favorites_counts(favorited)
+    assert set(before.values()) == {1}
+    user.delete()
+    assert set(favorites_counts(favorited).values()) == {0}
+    assert user_counts(author) == (60, 0)
+
+
+@pytest.mark.django_db
+def test_reconcile_fixes_drift(recipes, author, user):
+    # Фикстура создает избранное без счетчиков.
+    Subscribe.objects.create(follower=user, following=author)
+    CustomUser.objects.filter(id=author.id).update(recipes_count=3)
+    call_command('reconcile_counters', '--dry-run', '--batch-size', '7')
+    assert user_counts(author) == (3, 0)
+    with CaptureQueriesContext(connection) as queries:
+        call_command('reconcile_counters', '--batch-size', '7')
+    assert user_counts(author) == (60, 1)
+    assert favorites_counts(recipes) == {
+        recipe.id: int(index % 4 == 0) for index, recipe in enumerate(recipes)}
+    updates = [query['sql'] for query in queries
+               if query['sql'].startswith('UPDATE')]
+    # Значения считаются в UPDATE, а не переносятся из прочитанных строк.
+    assert updates and all('COUNT(' in sql for sql in updates)
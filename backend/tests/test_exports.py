@@ -0,0 +1,45 @@
+import tracemalloc
+
+import pytest
+
+from recipes.models import Ingredient, ShoppingListItem
+
+# Прирост пика памяти при росте списка в 5 раз; список из 25 000 позиций,
+# собранный целиком, занимает несколько мегабайт. Оба списка больше
+# пачки строк, которую читает курсор (ITERATOR_CHUNK_SIZE).
+MEMORY_GROWTH_LIMIT = 512 * 1024
+
+
+def fill_shopping_list(user, size):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {index:05}', measurement_unit='г')
+        for index in range(size))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user=user, ingredient_id=ingredient_id, amount=100)
+        for ingredient_id in Ingredient.objects.values_list('id', flat=True))
+
+
+def download_peak(client, export_format):
+    """Пик памяти при чтении ответа по частям и его размер."""
+    tracemalloc.start()
+    try:
+        response = client.get(
+            '/api/recipes/download_shopping_cart/', {'format': export_format})
+        assert response.status_code == 200
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        return tracemalloc.get_traced_memory()[1], size
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('export_format', ('txt', 'csv', 'json', 'pdf'))
+def test_download_memory_does_not_grow(export_format, user, user_client):
+    fill_shopping_list(user, 5000)
+    small_peak, small_size = download_peak(user_client, export_format)
+    ShoppingListItem.objects.all().delete()
+    Ingredient.objects.all().delete()
+    fill_shopping_list(user, 25000)
+    large_peak, large_size = download_peak(user_client, export_format)
+    assert large_size > 4 * small_size
+    assert large_peak - small_peak < MEMORY_GROWTH_LIMIT
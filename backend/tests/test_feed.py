@@ -0,0 +1,143 @@
+import json
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from api import counters, feed
+from recipes.models import FeedEntry, Recipe, Subscribe
+from users.models import CustomUser
+
+IMAGE = 'recipes/images/test.png'
+
+
+def make_author(name):
+    return CustomUser.objects.create(
+        username=name, email=f'{name}@example.com',
+        first_name=f'{name}-first', last_name=f'{name}-last')
+
+
+def subscribe(follower, author):
+    Subscribe.objects.create(follower=follower, following=author)
+    counters.change_followers(author.id, 1)
+
+
+def create_recipe(author, name, minutes_ago=0):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Описание', image=IMAGE,
+        cooking_time=10,
+        created=timezone.now() - timedelta(minutes=minutes_ago))
+    feed.publish(recipe)
+    return recipe
+
+
+def feed_ids(client, limit=100, **params):
+    response = client.get('/api/recipes/feed/', {'limit': limit, **params})
+    assert response.status_code == 200
+    return [item['id'] for item in response.data['results']]
+
+
+@pytest.mark.django_db
+def test_publish_fans_out_to_followers(user, author, user_client):
+    subscribe(user, author)
+    recipe = create_recipe(author, 'Блины')
+    assert recipe.fanned_out
+    assert list(FeedEntry.objects.values_list(
+        'follower_id', 'recipe_id')) == [(user.id, recipe.id)]
+    assert feed_ids(user_client) == [recipe.id]
+
+
+@pytest.mark.django_db
+def test_subscribe_backfills_and_unsubscribe_removes(user, author,
+                                                     user_client):
+    recipes = [create_recipe(author, f'Рецепт {index}', minutes_ago=index)
+               for index in range(3)]
+    assert not FeedEntry.objects.exists()
+    response = user_client.post(f'/api/users/{author.id}/subscribe/')
+    assert response.status_code == 201
+    assert set(FeedEntry.objects.filter(follower=user).values_list(
+        'recipe_id', flat=True)) == {recipe.id for recipe in recipes}
+    assert feed_ids(user_client) == [recipe.id for recipe in recipes]
+    response = user_client.delete(f'/api/users/{author.id}/subscribe/')
+    assert response.status_code == 204
+    assert not FeedEntry.objects.filter(follower=user).exists()
+    assert feed_ids(user_client) == []
+
+
+@pytest.mark.django_db
+def test_popular_author_is_read_directly(settings, user, author,
+                                         user_client):
+    settings.FEED_FANOUT_LIMIT = 0
+    subscribe(user, author)
+    recipe = create_recipe(author, 'Блины')
+    assert not recipe.fanned_out
+    assert not FeedEntry.objects.exists()
+    assert feed_ids(user_client) == [recipe.id]
+
+
+@pytest.mark.django_db
+def test_cursor_pages_merge_timeline_and_direct(settings, user, author,
+                                                user_client):
+    settings.FEED_FANOUT_LIMIT = 1
+    popular = make_author('popular')
+    subscribe(user, author)
+    subscribe(user, popular)
+    subscribe(make_author('other'), popular)
+    created = [
+        create_recipe(author if index % 3 else popular, f'Рецепт {index}',
+                      minutes_ago=index // 2)
+        for index in range(11)]
+    assert {recipe.fanned_out for recipe in created} == {True, False}
+    expected = [recipe.id for recipe in sorted(
+        created, key=lambda recipe: (recipe.created, recipe.id),
+        reverse=True)]
+    pages = []
+    params = {'cursor': ''}
+    while True:
+        response = user_client.get('/api/recipes/feed/',
+                                   {**params, 'limit': 4})
+        assert response.status_code == 200
+        pages.append([item['id'] for item in response.data['results']])
+        if response.data['next'] is None:
+            break
+        params = parse_qs(urlparse(response.data['next']).query)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert sum(pages, []) == expected
+
+
+@pytest.mark.django_db
+def test_imported_recipes_reach_followers(tmp_path, user, author):
+    subscribe(user, author)
+    recipe = {
+        'name': 'Блины', 'text': 'Описание', 'cooking_time': 20,
+        'image': IMAGE, 'tags': [], 'ingredients': [],
+        'author': {'email': author.email, 'username': author.username,
+                   'first_name': author.first_name,
+                   'last_name': author.last_name},
+    }
+    path = tmp_path / 'recipes.ndjson'
+    path.write_text(json.dumps(recipe, ensure_ascii=False) + '\n',
+                    encoding='utf-8')
+    call_command('import_recipes', str(path))
+    imported = Recipe.objects.get(name='Блины')
+    assert imported.fanned_out
+    assert list(FeedEntry.objects.values_list(
+        'follower_id', 'recipe_id')) == [(user.id, imported.id)]
+
+
+@pytest.mark.django_db
+def test_generated_recipes_reach_followers(ingredients):
+    call_command('generate_data', users=20, recipes=50, tags=3,
+                 subscriptions=3, favorites=1, cart=1, batch_size=7,
+                 stdout=StringIO())
+    followers = Counter(Subscribe.objects.values_list(
+        'following_id', flat=True))
+    expected = sum(followers[author_id] for author_id in
+                   Recipe.objects.values_list('author_id', flat=True))
+    assert expected
+    assert FeedEntry.objects.count() == expected
+    assert not Recipe.objects.filter(fanned_out=False).exists()
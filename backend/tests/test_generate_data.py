@@ -0,0 +1,32 @@
+import tracemalloc
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Recipe
+
+# Прирост пика памяти при росте числа рецептов в 5 раз. Команда хранит
+# id рецептов и веса для выбора популярных (около 2,5 МБ на 8000
+# рецептов), а список из 8000 объектов Recipe добавил бы еще 5 МБ.
+MEMORY_GROWTH_LIMIT = 4 * 1024 * 1024
+
+
+def generate_peak(prefix, recipes):
+    tracemalloc.start()
+    try:
+        call_command('generate_data', prefix=prefix, users=5, tags=2,
+                     recipes=recipes, ingredients_per_recipe=(1, 1),
+                     subscriptions=0, favorites=0, cart=0, batch_size=500,
+                     stdout=StringIO())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.django_db
+def test_recipes_are_inserted_in_bounded_memory(ingredients):
+    small_peak = generate_peak('small', 2000)
+    large_peak = generate_peak('large', 10000)
+    assert Recipe.objects.count() == 12000
+    assert large_peak - small_peak < MEMORY_GROWTH_LIMIT
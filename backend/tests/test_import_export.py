@@ -0,0 +1,41 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from api.management.commands import import_recipes
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+def export(path):
+    call_command('export_recipes', str(path), stderr=StringIO())
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.mark.django_db
+def test_export_then_import_restores_recipes(tmp_path, monkeypatch, recipes,
+                                             author):
+    exported = export(tmp_path / 'before.ndjson')
+    assert len(exported) == len(recipes)
+    Recipe.objects.all().delete()
+    author.delete()
+    # Имя автора занял другой пользователь: автор создается с суффиксом.
+    CustomUser.objects.create(
+        username='namesake', email='namesake@example.com',
+        first_name=author.first_name, last_name='namesake-last')
+    monkeypatch.setattr(import_recipes, 'LOOKUP_SIZE', 2)
+    command = import_recipes.Command()
+    call_command(command, str(tmp_path / 'before.ndjson'),
+                 '--batch-size', '7', stdout=StringIO())
+    assert all(len(lookup.ids) <= 2 for lookup in (
+        command.authors, command.tags, command.ingredients))
+    imported = CustomUser.objects.get(email=author.email)
+    assert imported.first_name != author.first_name
+    assert imported.first_name.startswith(author.first_name)
+    assert imported.recipes_count == len(recipes)
+    for record in exported:
+        record['author']['first_name'] = imported.first_name
+    assert export(tmp_path / 'after.ndjson') == exported
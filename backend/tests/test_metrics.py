@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings as django_settings
+from prometheus_client.parser import text_string_to_metric_families
+
+# Воркер gunicorn: обращения к кешу и запросы через MetricsMiddleware.
+WORKER = '''
+import sys
+
+import django
+
+django.setup()
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.metrics import MetricsMiddleware, record_cache
+
+hits, misses, requests = map(int, sys.argv[1:])
+for hit in [True] * hits + [False] * misses:
+    record_cache(hit)
+middleware = MetricsMiddleware(lambda request: HttpResponse())
+for _ in range(requests):
+    middleware(RequestFactory().get('/api/tags/'))
+'''
+
+
+def run_worker(directory, hits, misses, requests):
+    env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(directory),
+           'METRICS': 'True', 'METRICS_TOKEN': '',
+           'DJANGO_SETTINGS_MODULE': 'foodgram.settings'}
+    subprocess.run(
+        [sys.executable, '-c', WORKER, str(hits), str(misses), str(requests)],
+        cwd=django_settings.BASE_DIR, env=env, check=True)
+
+
+def samples(text):
+    return {(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(text)
+            for sample in family.samples}
+
+
+def test_metrics_are_summed_across_workers(tmp_path, monkeypatch, settings,
+                                           client):
+    run_worker(tmp_path, hits=3, misses=1, requests=2)
+    run_worker(tmp_path, hits=1, misses=3, requests=5)
+    settings.METRICS = True
+    settings.METRICS_TOKEN = ''
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    values = samples(response.content.decode())
+    assert values['recipe_cache_requests_total', (('result', 'hit'),)] == 4
+    assert values['recipe_cache_requests_total', (('result', 'miss'),)] == 4
+    assert values['recipe_cache_hit_ratio', ()] == pytest.approx(0.5)
+    assert values['http_request_db_queries_count',
+                  (('view', 'unknown'),)] == 7
@@ -0,0 +1,50 @@
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+BEFORE = ('recipes', '0011_ingredientamount_unique_recipe_ingredient')
+AFTER = ('recipes', '0012_ingredient_unique_ingredient_measurement_unit')
+
+
+def migrate(*targets):
+    executor = MigrationExecutor(connection)
+    executor.loader.build_graph()
+    executor.migrate(list(targets))
+    return executor.loader.project_state(list(targets)).apps
+
+
+@pytest.mark.django_db(transaction=True)
+def test_duplicate_ingredients_are_merged():
+    leaves = MigrationExecutor(connection).loader.graph.leaf_nodes()
+    apps = migrate(BEFORE)
+    try:
+        Ingredient = apps.get_model('recipes', 'Ingredient')
+        IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+        ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+        Recipe = apps.get_model('recipes', 'Recipe')
+        User = apps.get_model('users', 'CustomUser')
+        user = User.objects.create(username='cook', email='cook@example.com',
+                                   first_name='Повар', last_name='Поваров')
+        recipe = Recipe.objects.create(author=user, name='Блины', text='-',
+                                       image='test.png', cooking_time=5)
+        flour, copy, other_copy = [
+            Ingredient.objects.create(name='Мука', measurement_unit='г')
+            for _ in range(3)]
+        IngredientAmount.objects.create(recipe=recipe, ingredient=flour,
+                                        amount=100)
+        IngredientAmount.objects.create(recipe=recipe, ingredient=copy,
+                                        amount=50)
+        ShoppingListItem.objects.create(user=user, ingredient=other_copy,
+                                        amount=30)
+        apps = migrate(AFTER)
+        Ingredient = apps.get_model('recipes', 'Ingredient')
+        IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+        ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+        assert list(Ingredient.objects.values_list('id', flat=True)) == [
+            flour.id]
+        assert list(IngredientAmount.objects.values_list(
+            'ingredient_id', 'amount')) == [(flour.id, 150)]
+        assert list(ShoppingListItem.objects.values_list(
+            'ingredient_id', 'amount')) == [(flour.id, 30)]
+    finally:
+        migrate(*leaves)
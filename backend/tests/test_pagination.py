@@ -0,0 +1,38 @@
+import json
+from base64 import urlsafe_b64encode
+
+import pytest
+
+
+def cursor(payload):
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('value', (
+    'not-base64!',
+    cursor({'a': 1, 'b': 2}),
+    cursor([0, 'Рецепт']),
+    cursor([0, ['Рецепт']]),
+    cursor([0, ['Рецепт', 1, 2]]),
+    cursor([0, ['Рецепт', 'abc']]),
+    cursor([0, ['Рецепт', [1]]]),
+    cursor([0, ['Рецепт', 2 ** 70]]),
+    cursor([0, [None, 1]]),
+))
+def test_invalid_cursor_is_not_found(value, recipes, anon_client):
+    response = anon_client.get('/api/recipes/', {'cursor': value})
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_cursor_pages_cover_all_recipes(recipes, anon_client):
+    ids = []
+    url = '/api/recipes/?limit=25&cursor='
+    while url:
+        response = anon_client.get(url)
+        assert response.status_code == 200
+        ids += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+    assert sorted(ids) == sorted(recipe.id for recipe in recipes)
+    assert len(ids) == len(set(ids))
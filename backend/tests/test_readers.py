@@ -0,0 +1,60 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.readers import RECIPE_FIELDS, RecipeListReader
+from api.serializers import RecipeListSerializer
+from api.views import RecipeViewSet
+from recipes.models import IngredientAmount, Recipe, Subscribe
+
+
+def make_view(user):
+    request = Request(APIRequestFactory().get('/api/recipes/'))
+    request.user = user
+    return RecipeViewSet(request=request, action='list', format_kwarg=None)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('role', ('anon', 'auth'))
+def test_reader_matches_serializer(role, recipes, user, author):
+    Subscribe.objects.create(follower=user, following=author)
+    view = make_view(user if role == 'auth' else AnonymousUser())
+    expected = RecipeListSerializer(
+        view.get_queryset().order_by('name', 'id'), many=True,
+        context={'request': view.request}).data
+    rows = view.annotate_flags(Recipe.objects.all()).order_by(
+        'name', 'id').values(*RECIPE_FIELDS)
+    actual = RecipeListReader(view.request).serialize(rows)
+    assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
+    if role == 'auth':
+        assert any(item['is_favorited'] for item in actual)
+        assert any(item['is_in_shopping_cart'] for item in actual)
+        assert actual[0]['author']['is_subscribed']
+
+
+@pytest.mark.django_db
+def test_ingredient_order_matches_serializer(recipes, ingredients, user):
+    # Порядок строк по id расходится с индексом (recipe, ingredient).
+    recipe = recipes[0]
+    IngredientAmount.objects.filter(recipe=recipe).delete()
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in reversed(ingredients))
+    view = make_view(user)
+    queryset = view.get_queryset().filter(id=recipe.id)
+    with CaptureQueriesContext(connection) as queries:
+        expected = RecipeListSerializer(
+            queryset, many=True, context={'request': view.request}).data
+    # SQLite и так отдает строки по id, PostgreSQL - не обязательно.
+    prefetch = next(query['sql'] for query in queries
+                    if 'FROM "recipes_ingredientamount"' in query['sql'])
+    assert prefetch.endswith('ORDER BY "recipes_ingredientamount"."id" ASC')
+    rows = view.annotate_flags(queryset).values(*RECIPE_FIELDS)
+    actual = RecipeListReader(view.request).serialize(rows)
+    assert [item['id'] for item in actual[0]['ingredients']] == [
+        ingredient.id for ingredient in reversed(ingredients)]
+    assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
@@ -0,0 +1,64 @@
+import pytest
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.cache import recipe_cache
+
+
+@pytest.fixture
+def shared_cache(tmp_path):
+    """Кеш ответов в общем для процессов файловом кеше."""
+    with override_settings(RECIPE_CACHE_ALIAS='shared', CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path)},
+    }):
+        yield
+
+
+def names(response):
+    return [item['name'] for item in response.data['results']]
+
+
+@pytest.mark.django_db
+def test_process_cache_is_not_used(recipes, anon_client):
+    assert not recipe_cache.shared
+    response = anon_client.get('/api/recipes/')
+    assert response.status_code == 200
+    assert 'X-Cache' not in response
+
+
+@pytest.mark.django_db(transaction=True)
+def test_signal_clears_cached_responses(shared_cache, recipes, anon_client):
+    recipe = recipes[-1]
+    detail = f'/api/recipes/{recipe.id}/'
+    assert anon_client.get('/api/recipes/')['X-Cache'] == 'MISS'
+    assert anon_client.get('/api/recipes/')['X-Cache'] == 'HIT'
+    assert anon_client.get(detail)['X-Cache'] == 'MISS'
+    assert anon_client.get(detail)['X-Cache'] == 'HIT'
+    recipe.name = 'Новое название'
+    recipe.save()
+    response = anon_client.get('/api/recipes/')
+    assert response['X-Cache'] == 'MISS'
+    assert 'Новое название' in names(response)
+    response = anon_client.get(detail)
+    assert response['X-Cache'] == 'MISS'
+    assert response.data['name'] == 'Новое название'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_api_write_clears_cached_responses(shared_cache, recipes, author,
+                                           anon_client):
+    recipe = recipes[0]
+    before = names(anon_client.get('/api/recipes/'))
+    assert recipe.name in before
+    assert anon_client.get('/api/recipes/')['X-Cache'] == 'HIT'
+    client = APIClient()
+    client.force_authenticate(author)
+    assert client.delete(f'/api/recipes/{recipe.id}/').status_code == 204
+    response = anon_client.get('/api/recipes/')
+    assert response['X-Cache'] == 'MISS'
+    assert recipe.name not in names(response)
+    assert anon_client.get(f'/api/recipes/{recipe.id}/').status_code == 404
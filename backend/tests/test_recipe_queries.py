@@ -0,0 +1,18 @@
+import pytest
+
+# Теги рецептов для ключа кеша, COUNT, страница рецептов, авторы, теги,
+# ингредиенты; пользователю еще токен и его подписки.
+LIST_QUERIES = {'anon': 6, 'auth': 8}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('role', LIST_QUERIES)
+@pytest.mark.parametrize('limit', (6, 50))
+def test_recipe_list_queries_do_not_depend_on_page_size(
+        role, limit, recipes, anon_client, user_client,
+        django_assert_num_queries):
+    client = user_client if role == 'auth' else anon_client
+    with django_assert_num_queries(LIST_QUERIES[role]):
+        response = client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
@@ -0,0 +1,80 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient
+
+
+def png():
+    image = BytesIO()
+    Image.new('RGB', (1, 1)).save(image, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        image.getvalue()).decode()
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def many_ingredients(db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Продукт {index:02}', measurement_unit='г')
+        for index in range(40))
+    return list(Ingredient.objects.order_by('id'))
+
+
+def recipe_data(tags, ingredients, amount=1):
+    return {
+        'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+        'tags': [tag.id for tag in tags],
+        'ingredients': [{'id': ingredient.id, 'amount': amount}
+                        for ingredient in ingredients],
+    }
+
+
+def patch_queries(client, recipe_id, data):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.patch(f'/api/recipes/{recipe_id}/', data,
+                                format='json')
+    assert response.status_code == 200, response.data
+    return len(queries), response.data
+
+
+@pytest.mark.django_db
+def test_write_queries_do_not_depend_on_ingredients(
+        settings, tmp_path, author_client, tags, many_ingredients):
+    settings.MEDIA_ROOT = tmp_path
+    counts = {}
+    for size in (5, 20):
+        first = many_ingredients[:size]
+        response = author_client.post(
+            '/api/recipes/',
+            {**recipe_data(tags, first), 'image': png()}, format='json')
+        assert response.status_code == 201, response.data
+        assert len(response.data['ingredients']) == size
+        changed = first[:size // 2] + many_ingredients[20:20 + size // 2]
+        counts[size], data = patch_queries(
+            author_client, response.data['id'],
+            {**recipe_data(tags[:1], changed, amount=2), 'image': png()})
+        assert [item['id'] for item in data['ingredients']] == [
+            ingredient.id for ingredient in changed]
+        assert {item['amount'] for item in data['ingredients']} == {2}
+    assert counts[5] == counts[20]
+
+
+@pytest.mark.django_db
+def test_unknown_ingredient_is_rejected(author_client, tags, ingredients):
+    data = recipe_data(tags, ingredients[:2])
+    data['ingredients'].append({'id': 10 ** 6, 'amount': 1})
+    response = author_client.post('/api/recipes/', data, format='json')
+    assert response.status_code == 400
+    assert response.data['ingredients'][2]['id']
@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+from django.core.cache import cache
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite
+
+
+@pytest.fixture
+def replica(settings, tmp_path, recipes, user_client):
+    """Реплика на второй базе SQLite: снимок основной, дальше отстает."""
+    if connection.vendor != 'sqlite':
+        pytest.skip('Снимок базы делается средствами SQLite.')
+    path = tmp_path / 'replica.sqlite3'
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    connection.connection.backup(target)
+    target.close()
+    connections.databases['replica'] = {
+        **connections.databases['default'], 'NAME': str(path)}
+    settings.REPLICA_DATABASE = 'replica'
+    yield
+    connections['replica'].close()
+    del connections['replica']
+    del connections.databases['replica']
+
+
+def token_client(client):
+    other = APIClient()
+    other.credentials(**client._credentials)
+    return other
+
+
+@pytest.mark.django_db(transaction=True)
+def test_write_pins_reads_in_every_process(replica, recipes, user,
+                                           user_client):
+    recipe = next(recipe for recipe in recipes
+                  if not Favorite.objects.filter(user=user,
+                                                 recipe=recipe).exists())
+    url = f'/api/recipes/{recipe.id}/'
+    response = user_client.post(f'/api/recipes/{recipe.id}/favorite/')
+    assert response.status_code == 201
+    assert not Favorite.objects.using('replica').filter(
+        user=user, recipe=recipe).exists()
+    # Другой процесс gunicorn: кеш процесса без отметки, cookie у клиента.
+    cache.clear()
+    assert user_client.get(url).data['is_favorited'] is True
+    assert token_client(user_client).get(url).data['is_favorited'] is False
+
+
+@pytest.mark.django_db(transaction=True)
+def test_forged_pin_is_ignored(replica, recipes, user, user_client):
+    recipe = recipes[1]
+    Favorite.objects.create(user=user, recipe=recipe)
+    user_client.cookies['replica_pin'] = str(user.id)
+    response = user_client.get(f'/api/recipes/{recipe.id}/')
+    assert response.data['is_favorited'] is False
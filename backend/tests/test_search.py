@@ -0,0 +1,20 @@
+import pytest
+from django.test import override_settings
+
+from recipes.models import Ingredient
+
+
+@pytest.mark.django_db
+@override_settings(INGREDIENT_INDEX_RECHECK=0)
+def test_index_sees_ingredients_loaded_elsewhere(ingredients, anon_client):
+    response = anon_client.get('/api/ingredients/', {'name': 'Соль'})
+    assert response.data == []
+    etag = response['ETag']
+    # bulk_create не вызывает сигналы и не меняет версию в кеше, как
+    # загрузка командой в другом процессе.
+    Ingredient.objects.bulk_create([Ingredient(name='Соль',
+                                               measurement_unit='г')])
+    response = anon_client.get('/api/ingredients/', {'name': 'Соль'},
+                               HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert [item['name'] for item in response.data] == ['Соль']
@@ -0,0 +1,56 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework.test import APIClient
+
+from api.shopping_list import compute_totals, stored_totals
+from recipes.models import Recipe, ShoppingListItem, ShoppingСart
+
+
+@pytest.mark.django_db
+def test_rebuild_restores_shopping_lists(recipes, user):
+    ShoppingListItem.objects.filter(user=user).delete()
+    with pytest.raises(CommandError):
+        call_command('rebuild_shopping_lists', '--verify')
+    call_command('rebuild_shopping_lists')
+    call_command('rebuild_shopping_lists', '--verify')
+    assert stored_totals([user.id]) == compute_totals([user.id])
+    assert stored_totals([user.id])
+
+
+def assert_in_sync(*users):
+    user_ids = [user.id for user in users]
+    assert stored_totals(user_ids) == compute_totals(user_ids)
+
+
+@pytest.mark.django_db
+def test_cart_changes_outside_views_update_list(recipes, user):
+    call_command('rebuild_shopping_lists')
+    cart = ShoppingСart.objects.create(user=user, recipe=recipes[1])
+    assert_in_sync(user)
+    cart.delete()
+    ShoppingСart.objects.filter(recipe=recipes[5]).delete()
+    assert_in_sync(user)
+
+
+@pytest.mark.django_db
+def test_recipe_and_user_delete_update_lists(recipes, user, author):
+    ShoppingСart.objects.create(user=author, recipe=recipes[0])
+    call_command('rebuild_shopping_lists')
+    recipes[0].delete()
+    Recipe.objects.filter(
+        id__in=[recipe.id for recipe in recipes[5:20]]).delete()
+    assert_in_sync(user, author)
+    author.delete()
+    assert_in_sync(user)
+
+
+@pytest.mark.django_db
+def test_recipe_delete_through_api_updates_lists(recipes, user, author):
+    ShoppingСart.objects.create(user=author, recipe=recipes[0])
+    call_command('rebuild_shopping_lists')
+    client = APIClient()
+    client.force_authenticate(author)
+    response = client.delete(f'/api/recipes/{recipes[0].id}/')
+    assert response.status_code == 204
+    assert_in_sync(user, author)
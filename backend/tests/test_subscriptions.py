@@ -0,0 +1,52 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, Subscribe
+from users.models import CustomUser
+
+
+@pytest.fixture
+def authors(user):
+    """Восемь авторов с тремя рецептами, на всех подписан пользователь."""
+    authors = [CustomUser.objects.create(
+        username=f'author-{index}', email=f'author-{index}@example.com',
+        first_name=f'first-{index}', last_name=f'last-{index}')
+        for index in range(8)]
+    Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'Рецепт {number}', text='Описание',
+               image='recipes/images/test.png', cooking_time=10)
+        for author in authors for number in (3, 1, 2))
+    Subscribe.objects.bulk_create(
+        Subscribe(follower=user, following=author) for author in authors)
+    return authors
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', (2, 8))
+def test_recipes_are_ranked_for_page_authors_only(limit, authors,
+                                                  user_client):
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.get('/api/users/subscriptions/',
+                                   {'limit': limit, 'recipes_limit': 2})
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == limit
+    for author in results:
+        assert [recipe['name'] for recipe in author['recipes']] == [
+            'Рецепт 1', 'Рецепт 2']
+    ranked, = (query['sql'] for query in queries.captured_queries
+               if 'ROW_NUMBER' in query['sql'])
+    ranked_authors = ranked.split('author_id IN (')[-1].split(')')[0]
+    assert set(ranked_authors.split(', ')) == {
+        str(author['id']) for author in results}
+
+
+@pytest.mark.django_db
+def test_subscribe_response_has_limited_recipes(authors, user, user_client):
+    Subscribe.objects.filter(follower=user, following=authors[0]).delete()
+    response = user_client.post(
+        f'/api/users/{authors[0].id}/subscribe/?recipes_limit=1')
+    assert response.status_code == 201
+    assert [recipe['name'] for recipe in response.data['recipes']] == [
+        'Рецепт 1']
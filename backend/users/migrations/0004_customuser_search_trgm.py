@@ -0,0 +1,37 @@
+from django.db import migrations
+
+INDEX = 'users_customuser_search_trgm'
+
+
+def create_index(apps, schema_editor):
+    """GIN-индекс pg_trgm по строке "username first_name last_name".
+
+    Выражение совпадает с api.search.UserSearchText. На других СУБД
+    поиск работает без индекса.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX} '
+        'ON users_customuser USING gin '
+        "((username || ' ' || first_name || ' ' || last_name) "
+        'gin_trgm_ops)')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_auto_20261018_1954'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
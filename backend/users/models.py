@@ -40,6 +40,14 @@ class CustomUser(AbstractUser):
             RegexValidator(r'^[\w.@+-]+\Z'),
         ],
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
 
     class Meta:
         ordering = ('username',)
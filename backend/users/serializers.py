@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from recipes.models import Subscribe
+from api.relations import get_relations
 from .models import CustomUser
 
 
@@ -13,8 +13,7 @@ class ProfileSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(follower=user,
-                                        following=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context['request']
+        return obj.id in get_relations(request).subscriptions
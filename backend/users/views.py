@@ -1,11 +1,13 @@
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from djoser.views import UserViewSet
-from rest_framework.filters import SearchFilter
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 
 from .models import CustomUser
 from .serializers import ProfileSerializer
 from api.pagination import CustomPaginator
+from api.search import UserSearchFilter
+from recipes.models import Subscribe
 
 
 class UserViewSet(UserViewSet):
@@ -13,9 +15,18 @@ class UserViewSet(UserViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = (AllowAny, IsAuthenticatedOrReadOnly)
-    filter_backends = (SearchFilter,)
-    search_fields = ('username',)
+    filter_backends = (UserSearchFilter,)
     pagination_class = CustomPaginator
+    replica_actions = ('list',)
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_authenticated:
+            is_subscribed = Exists(Subscribe.objects.filter(
+                follower=user, following=OuterRef('pk')))
+        else:
+            is_subscribed = Value(False, output_field=BooleanField())
+        return super().get_queryset().annotate(is_subscribed=is_subscribed)
 
     def get_permissions(self):
         if self.action == 'me':